@@ -1,11 +1,17 @@
 
 import os
+import asyncio
 import logging
 from typing import Dict, Any
-from google.adk.agents import LoopAgent, LlmAgent, SequentialAgent
+from google.adk.agents import BaseAgent, LoopAgent, LlmAgent, ParallelAgent, SequentialAgent
 from google.adk.tools.tool_context import ToolContext
 from app.agents.email_aggregator import EmailAggregator
 from app.services.user_context_service import UserContextService
+from app.agents.llm_models import build_model
+from app.services.context_cache import PromptPrefixCache, get_prefix_cache
+from app.services.model_router import ModelRouter, get_model_router
+from app.services.cancellation import current_cancellation_token
+from app.agents.speculative_refiner import STYLE_SEEDS, TEMPERATURES, VERDICT_KEY, SpeculativeRefiner, draft_key
 
 logger = logging.getLogger(__name__)
 
@@ -20,21 +26,171 @@ def exit_loop(tool_context: ToolContext):
     return {}
 
 
+# --- Refinement ---
+# The Drafter instruction is shared by the loop Drafter, the speculative drafters and the Fixer,
+# so all of them hit the same model-side cached prefix.
+
+DRAFTER_INSTRUCTION = """
+            You are an expert news editor. 
+            Input Emails: {{emails_content}}
+            
+            Task:
+            The latest message contains the user's 'Request', the 'Current Draft' and the 'Critique'.
+            If 'Current Draft' is empty, write a concise, engaging news digest based on 'Input Emails'.
+            Honor what the 'Request' asks for (focus, format, length).
+            If 'Critique' is present, refine the 'Current Draft' based on the feedback.
+            If a 'Style Seed' is present, follow it for the structure and angle of the digest.
+            
+            Style Requirements:
+            - Mimic the tone of NYT Hardfork (https://podscan.fm/podcasts/the-daily/episodes/hard-fork-an-interview-with-sam-altman) or Peter Kafka https://podcasts.voxmedia.com/show/channels-with-peter-kafka.
+            - Be conversational, insightful, and slightly witty.
+            - Focus on the "so what?" - why does this news matter?
+            
+            Output ONLY the digest text.
+            """
+
+REVIEW_CRITERIA = """
+            1. **Style**: Does it sound like NYT Hardfork / Peter Kafka? Is it conversational and witty?
+            2. **Substance**: Does it capture the key points from the emails?
+            3. **Conciseness**: Is it referencing data points without being verbose?
+            """
+
+# The Critic and the Judge only see the drafts: a second inbox-sized prefix would mean another cache
+# per request, and the whole inbox on every review turn whenever caching is unavailable.
+CRITIC_INSTRUCTION = """
+            You are a Senior Editor at New Yorker Magazine.
+            
+            Task:
+            The latest message contains the user's 'Request' and the 'Draft to Review'.
+            Review the draft against the user's 'Request' and the following criteria:
+            """ + REVIEW_CRITERIA + """
+            If the draft meets these criteria, call the 'exit_loop' tool.
+            If it needs improvement (especially on tone/style), provide specific, actionable feedback.
+            """
+
+JUDGE_INSTRUCTION = """
+            You are a Senior Editor at New Yorker Magazine.
+            
+            Task:
+            The latest message contains the user's 'Request' and several candidate digests ('Draft 1', 'Draft 2', ...).
+            Score each draft against the user's 'Request' and the following criteria, and pick the best one:
+            """ + REVIEW_CRITERIA + """
+            Respond with JSON only: {"best": <draft number>, "approved": <true|false>, "fix": "<feedback>"}.
+            Set "approved" to true if the best draft is ready to publish as is.
+            Otherwise set it to false and put ONE specific, targeted fix for the best draft in "fix".
+            """
+
+
+def build_refinement_agent(model, prefix_cache: PromptPrefixCache, strategy: str = "loop", num_drafts: int = 3, critic_model=None, router: ModelRouter = None, drafter_candidates: list[str] = None) -> BaseAgent:
+    """
+    Builds the drafting stage; it reads `emails_content` and leaves the digest in `current_digest`.
+    Drafters/Fixer use `model`, Critic/Judge use `critic_model`; with a `router`, each call's model
+    is picked per stage (drafter calls from `drafter_candidates` when given) before the prefix
+    cache (which is per model) is consulted.
+    """
+    from google.genai import types
+
+    critic_model = critic_model or model
+
+    def callbacks(stage: str, cache_callback):
+        if not router:
+            return cache_callback
+        return [router.callback(stage, drafter_candidates if stage == "drafter" else None), cache_callback]
+
+    if strategy == "speculative":
+        num_drafts = max(1, min(num_drafts, len(STYLE_SEEDS)))
+        drafters = [
+            LlmAgent(
+                name=f"Drafter_{i + 1}",
+                model=model,
+                instruction=DRAFTER_INSTRUCTION,
+                include_contents="none",
+                generate_content_config=types.GenerateContentConfig(temperature=TEMPERATURES[i]),
+                before_model_callback=callbacks("drafter", prefix_cache.callback({}, fixed={"Current Draft": "", "Critique": "", "Style Seed": STYLE_SEEDS[i]})),
+                output_key=draft_key(i)
+            )
+            for i in range(num_drafts)
+        ]
+        judge = LlmAgent(
+            name="Judge",
+            model=critic_model,
+            instruction=JUDGE_INSTRUCTION,
+            include_contents="none",
+            generate_content_config=types.GenerateContentConfig(temperature=0.0, response_mime_type="application/json"),
+            before_model_callback=callbacks("critic", prefix_cache.callback({f"Draft {i + 1}": draft_key(i) for i in range(num_drafts)})),
+            output_key=VERDICT_KEY
+        )
+        fixer = LlmAgent(
+            name="Fixer",
+            model=model,
+            instruction=DRAFTER_INSTRUCTION,
+            include_contents="none",
+            before_model_callback=callbacks("drafter", prefix_cache.callback({"Current Draft": "current_digest", "Critique": "critique"})),
+            output_key="current_digest"
+        )
+        return SpeculativeRefiner(
+            name="SpeculativeRefiner",
+            draft_panel=ParallelAgent(name="DraftPanel", sub_agents=drafters),
+            judge=judge,
+            fixer=fixer
+        )
+
+    # Serial loop. The instruction is the stable prefix (instructions + email context) and is cached
+    # model-side; the draft and critique are sent as the only per-iteration content.
+    drafter_agent = LlmAgent(
+        name="Drafter",
+        model=model,
+        instruction=DRAFTER_INSTRUCTION,
+        include_contents="none",
+        before_model_callback=callbacks("drafter", prefix_cache.callback({"Current Draft": "current_digest", "Critique": "critique"})),
+        output_key="current_digest"
+    )
+    critic_agent = LlmAgent(
+        name="Critic",
+        model=critic_model,
+        instruction=CRITIC_INSTRUCTION,
+        tools=[exit_loop],
+        include_contents="none",
+        before_model_callback=callbacks("critic", prefix_cache.callback({"Draft to Review": "current_digest"})),
+        output_key="critique"
+    )
+    return LoopAgent(
+        name="RefinementLoop",
+        sub_agents=[drafter_agent, critic_agent],
+        max_iterations=3
+    )
+
 
 # --- Agents Orchestration ---
 
 class AlbertAgentOrchestrator:
-    def __init__(self, model_name: str = "gemini-2.5-flash"):
-        self.model_name = model_name
+    def __init__(self, model_name: str = None, prefix_cache: PromptPrefixCache = None, refinement: str = None, num_drafts: int = None, router: ModelRouter = None):
+        # Per-stage candidates live in the router (MODEL_AGGREGATOR / MODEL_DRAFTER / MODEL_CRITIC);
+        # `model_name` is the drafter's primary model, i.e. the one that writes the digest. The router
+        # is shared by the process, so an override is kept here rather than written into it.
+        self.router = router or get_model_router()
+        self.model_name = model_name or self.router.primary("drafter")
+        self.drafter_candidates = [self.model_name] + [m for m in self.router.stage_models["drafter"] if m != self.model_name]
+        # REFINEMENT_STRATEGY: "loop" (serial Drafter -> Critic, default) or "speculative" (parallel drafts + one Judge)
+        self.refinement = (refinement or os.getenv("REFINEMENT_STRATEGY", "loop")).lower()
+        self.num_drafts = num_drafts or int(os.getenv("SPECULATIVE_DRAFTS", "3"))
+        # Shared across requests; FakeContextCache via CONTEXT_CACHE_BACKEND=fake for offline runs
+        self.prefix_cache = prefix_cache or get_prefix_cache()
         self.email_aggregator = EmailAggregator()
         self.context_service = UserContextService()
 
     def create_agent(self) -> SequentialAgent:
+        # All LLM calls share the client-side rate governor (see app/services/rate_governor.py);
+        # each stage reports latency/errors to the model router, which picks the model per call.
+        model = build_model(self.model_name, stage="drafter")
+        aggregator_model = build_model(self.router.primary("aggregator"), stage="aggregator")
+        critic_model = build_model(self.router.primary("critic"), stage="critic")
+
         # 1. Email Aggregator Agent
         # Task: Search relevant emails based on semantic similarity between user's query and email labels (if exists),
         # or email subjects lines. Return top 20 emails matched.
         
-        def fetch_emails_tool(tool_context: ToolContext, query: str, days: int = 14) -> str:
+        async def fetch_emails_tool(tool_context: ToolContext, query: str, days: int = 14) -> str:
             """
             Fetches and ranks emails based on the semantic similarity with the user query.
             Args:
@@ -52,15 +208,18 @@ class AlbertAgentOrchestrator:
             if "critique" not in tool_context.state:
                 tool_context.state["critique"] = ""
             
-            # Use semantic search
+            # Use semantic search. Gmail paging and embedding block, so they run in a thread that stops
+            # at its next checkpoint once the request's cancellation token fires (client disconnected).
             logger.info(f" [Tool Call] fetch_emails_tool executing for query: {query}")
-            emails = self.email_aggregator.semantic_search(query, days=days, max_results=50)
+            emails = await asyncio.to_thread(
+                self.email_aggregator.semantic_search, query, days=days, max_results=50, cancel_token=current_cancellation_token()
+            )
             logger.info(f" [Tool Call] fetch_emails_tool returned {len(emails)} emails")
             return str(emails)
 
         aggregator_agent = LlmAgent(
             name="EmailAggregator",
-            model=self.model_name,
+            model=aggregator_model,
             instruction="""
             You are an Email Assistant. Your goal is to fetch emails based on the user's request.
             1. Understand the user's intent (e.g., "AI news", "Job market trends").
@@ -69,74 +228,23 @@ class AlbertAgentOrchestrator:
             4. Output the retrieved emails into the context for the next agent.
             """,
             tools=[fetch_emails_tool],
+            before_model_callback=self.router.callback("aggregator"),
             output_key="emails_content" 
         )
 
-        # 2. Refinement Loop
-        # Task: Generate and refine the draft based on the user's feedback.
-        
-        # 2a. Drafter
-        drafter_agent = LlmAgent(
-            name="Drafter",
-            model=self.model_name,
-            instruction="""
-            You are an expert news editor. 
-            Input Emails: {{emails_content}}
-            Current Draft: {{current_digest}}
-            Critique: {{critique}}
-            
-            Task:
-            If 'Current Draft' is empty, write a concise, engaging news digest based on 'Input Emails'.
-            If 'Critique' is present, refine the 'Current Draft' based on the feedback.
-            
-            Style Requirements:
-            - Mimic the tone of NYT Hardfork (https://podscan.fm/podcasts/the-daily/episodes/hard-fork-an-interview-with-sam-altman) or Peter Kafka https://podcasts.voxmedia.com/show/channels-with-peter-kafka.
-            - Be conversational, insightful, and slightly witty.
-            - Focus on the "so what?" - why does this news matter?
-            
-            Output ONLY the digest text.
-            """,
-            output_key="current_digest"
-        )
-
-        # 2b. Critic
-        critic_agent = LlmAgent(
-            name="Critic",
-            model=self.model_name,
-            instruction="""
-            You are a Senior Editor at New Yorker Magazine.
-            Draft to Review: {{current_digest}}
-            
-            Task:
-            Review the draft against the following criteria:
-            1. **Style**: Does it sound like NYT Hardfork / Peter Kafka? Is it conversational and witty?
-            2. **Substance**: Does it capture the key points from the emails?
-            3. **Conciseness**: Is it referencing data points without being verbose?
-            
-            If the draft meets these criteria, call the 'exit_loop' tool.
-            If it needs improvement (especially on tone/style), provide specific, actionable feedback.
-            """,
-            tools=[exit_loop],
-            output_key="critique"
-        )
-
-        refinement_loop = LoopAgent(
-            name="RefinementLoop",
-            sub_agents=[drafter_agent, critic_agent],
-            max_iterations=3
-        )
-
-
+        # 2. Refinement: serial Drafter -> Critic loop, or speculative parallel drafting
+        refinement_agent = build_refinement_agent(model, self.prefix_cache, self.refinement, self.num_drafts, critic_model=critic_model,
+                                                  router=self.router, drafter_candidates=self.drafter_candidates)
 
         # Create Sequential Agent
         # The SequentialAgent will run these agents in order.
         # 1. Aggregator: Fetches emails.
-        # 2. RefinementLoop: Drafts and critiques the digest.
+        # 2. Refinement: Drafts and critiques the digest (RefinementLoop or SpeculativeRefiner).
         # 3. AudioGenerator: Converts the final digest to audio.
         
         sequential_agent = SequentialAgent(
             name="AlbertOrchestrator",
-            sub_agents=[aggregator_agent, refinement_loop]
+            sub_agents=[aggregator_agent, refinement_agent]
         )
         
         return sequential_agent
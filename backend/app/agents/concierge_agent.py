@@ -2,16 +2,30 @@ import logging
 import uuid
 import os
 import json
+import time
+import asyncio
+from datetime import datetime
 
 from app.services.cloud_logger import CloudLogger
 from app.agents.agent_workflow import AlbertAgentOrchestrator
 from app.services.tts_service import TextToSpeechService
-from google.adk.runners import InMemoryRunner
+from app.services.audio_profiles import resolve_profile
+from app.services.cancellation import CancellationToken, observe_pipeline_seconds, record_cancellation, set_cancellation_token
+from app.services.digest_cache import DigestCache, normalize_query, extract_days
+from app.services.single_flight import AsyncSingleFlight
+from app.services.session_store import get_session_service
+from app.services.model_router import start_stage_recording
+from google.adk.runners import Runner
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.memory import InMemoryMemoryService
 from opentelemetry import trace
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
+# Identical in-flight /chat requests (double clicks, several tabs) share one pipeline run.
+_chat_flight = AsyncSingleFlight("chat")
+
 class ConciergeAgent:
     def __init__(self):
         try:
@@ -19,13 +33,19 @@ class ConciergeAgent:
         except Exception as e:
             logger.warning(f"Failed to initialize CloudLogger: {e}. Logging will be disabled.")
             self.cloud_logger = None
-        
+
         # Default to flash, but can be overridden in next iteraction by users.
         self.orchestrator = AlbertAgentOrchestrator()
-        self.runner = InMemoryRunner(
-            agent=self.orchestrator.create_agent()
+
+        # Sessions live in the shared, bounded (or SQLite-backed) session service
+        self.runner = Runner(
+            app_name="albert",
+            agent=self.orchestrator.create_agent(),
+            session_service=get_session_service(),
+            artifact_service=InMemoryArtifactService(),
+            memory_service=InMemoryMemoryService()
         )
-        
+
         # Initialize TTS Service
         try:
             self.tts_service = TextToSpeechService()
@@ -33,126 +53,258 @@ class ConciergeAgent:
             logger.error(f"Failed to initialize TTS Service: {e}")
             self.tts_service = None
 
-    async def process_request(self, user_input: str) -> dict:
+        # Pre-computed digests (filled by the DigestScheduler)
+        self.digest_cache = DigestCache()
+
+    def _cache_query_for(self, user_input: str) -> str:
         """
-        Processes user input using the ADK pipeline.
+        Maps a user message to the digest cache key.
+        "Run it again"-style requests resolve to the last used query.
+        """
+        if DigestCache.is_repeat_request(user_input):
+            last_labels = self.orchestrator.context_service.get_last_labels()
+            if last_labels:
+                return " ".join(last_labels)
+        return user_input
+
+    def _compose_response(self, user_input: str, digest: str, audio_url: str) -> str:
+        user_input_lower = user_input.lower()
+        wants_text = any(keyword in user_input_lower for keyword in ["text", "read", "summary", "bullet", "show me", "written"])
+
+        audio_message = f"\n\n🎧 **[Listen to your Audio Digest Now! (opening in a new browser)]({audio_url})**"
+
+        if wants_text:
+            return digest + audio_message
+        return f"I've cooked up a fresh audio digest for you! {audio_message} Please note that the audio digest will be available for 48 hours. \n So don't leave me hanging for too long 😉."
+
+    async def _run_pipeline(self, user_input: str, session_id: str, user_id: str = "user") -> str:
+        """
+        Runs the ADK pipeline for a single message and returns the final digest text.
+        """
+        response_text = ""
+
+        # Ensure session exists with initial state (resumed sessions keep their history)
+        app_name = getattr(self.runner, "app_name", "default")
+        existing = await self.runner.session_service.get_session(
+            session_id=session_id,
+            user_id=user_id,
+            app_name=app_name
+        )
+        if not existing:
+            await self.runner.session_service.create_session(
+                session_id=session_id,
+                user_id=user_id,
+                app_name=app_name,
+                state={
+                    "current_digest": "",
+                    "critique": ""
+                }
+            )
+
+        # Construct Message
+        class SimplePart:
+            def __init__(self, text):
+                self.text = text
+        class SimpleMessage:
+            def __init__(self, role, content):
+                self.role = role
+                self.parts = [SimplePart(content)]
+
+        user_msg = SimpleMessage(role="user", content=user_input)
+
+        # Run Pipeline Async
+        async for event in self.runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=user_msg
+        ):
+            # Trace and Log Intermediate Steps
+            if hasattr(event, "text") and event.text:
+                response_text = event.text
+                # Log intermediate text events (potential agent outputs)
+                if self.cloud_logger:
+                    self.cloud_logger.log_struct({
+                        "session_id": session_id,
+                        "step": "agent_output",
+                        "content": event.text[:1000], # Truncate for log
+                        "timestamp": datetime.now().isoformat()
+                    })
+
+            if hasattr(event, "tool_calls") and event.tool_calls:
+                logger.info(f"Tool called: {event.tool_calls}")
+                if self.cloud_logger:
+                    self.cloud_logger.log_struct({
+                        "session_id": session_id,
+                        "step": "tool_call",
+                        "tool_calls": str(event.tool_calls),
+                        "timestamp": datetime.now().isoformat()
+                    })
+
+        if not response_text:
+             # Fallback logic (same as before)
+             session = await self.runner.session_service.get_session(
+                 session_id=session_id,
+                 user_id=user_id,
+                 app_name=app_name
+             )
+             if session and session.events:
+                 for event in reversed(session.events):
+                     if hasattr(event, "actions") and event.actions and hasattr(event.actions, "state_delta"):
+                         state_delta = event.actions.state_delta
+                         if state_delta and "current_digest" in state_delta:
+                             response_text = state_delta["current_digest"]
+                             logger.info("Found digest in state_delta.")
+                             break
+
+                 if not response_text:
+                     # ... (rest of fallback logic)
+                     for event in reversed(session.events):
+                         text = ""
+                         if hasattr(event, "content") and event.content and hasattr(event.content, "parts"):
+                             for part in event.content.parts:
+                                 if hasattr(part, "text") and part.text:
+                                     text += part.text
+                         if text:
+                             if len(text) > 100:
+                                 response_text = text
+                                 break
+                             elif not response_text:
+                                 response_text = text
+
+        return response_text
+
+    @staticmethod
+    def _trace_stage_models(span, stage_models: dict):
+        for stage, model in stage_models.items():
+            span.set_attribute(f"model.{stage}", model)
+
+    async def precompute_digest(self, query: str, user_id: str = "user") -> dict:
+        """
+        Builds a digest ahead of time and stores text + audio in the digest cache.
+        Returns per-stage timing stats for the run.
         """
         session_id = str(uuid.uuid4())
+        stats = {"session_id": session_id, "query": query}
+
+        with tracer.start_as_current_span("precompute_digest") as span:
+            span.set_attribute("session_id", session_id)
+            span.set_attribute("user_id", user_id)
+            span.set_attribute("input", query)
+
+            started = time.perf_counter()
+            stage_models = start_stage_recording()
+            digest = await self._run_pipeline(query, session_id, user_id=user_id)
+            stats["pipeline_seconds"] = round(time.perf_counter() - started, 3)
+            observe_pipeline_seconds(stats["pipeline_seconds"])
+            stats["models"] = dict(stage_models)
+            self._trace_stage_models(span, stage_models)
+            if not digest:
+                raise RuntimeError("Pipeline returned an empty digest")
+
+            audio_file = None
+            if self.tts_service:
+                audio_profile = resolve_profile()
+                audio_started = time.perf_counter()
+                with tracer.start_as_current_span("generate_audio"):
+                    audio_file = await asyncio.to_thread(self.tts_service.generate_audio_file, digest, audio_profile)
+                stats["audio_seconds"] = round(time.perf_counter() - audio_started, 3)
+                stats["audio_profile"] = audio_profile
+
+            stats["total_seconds"] = round(time.perf_counter() - started, 3)
+            self.digest_cache.put(user_id, query, digest, audio_file, stats=stats)
+            logger.info(f"Pre-computed digest for '{query}' in {stats['total_seconds']}s")
+            return stats
+
+    async def process_request(self, user_input: str, user_id: str = "user", session_id: str = None, audio_profile: str = None) -> dict:
+        """
+        Processes user input using the ADK pipeline.
+        Pass a previous `session_id` to resume that session, and an `audio_profile` (see
+        app/services/audio_profiles.py) to pick the audio encoding.
+        Concurrent duplicates (same user, normalized query, days window and profile) are coalesced.
+        """
+        audio_profile = resolve_profile(audio_profile)
+        if session_id:
+            # Resumed conversations carry their own history, never coalesce them.
+            return await self._process_request(user_input, user_id, session_id, audio_profile)
+        key = (user_id, normalize_query(user_input), extract_days(user_input), audio_profile)
+        return await _chat_flight.do(key, self._process_request, user_input, user_id, None, audio_profile)
+
+    async def _process_request(self, user_input: str, user_id: str, session_id: str = None, audio_profile: str = None) -> dict:
+        """
+        Runs one request. The task is cancelled when its last waiting client disconnects (see
+        chat_endpoint); the cancellation token then stops Gmail, embedding and TTS work in threads.
+        """
+        cancel_token = CancellationToken()
+        # Read by the ADK email tool, which can't take the token as an argument
+        set_cancellation_token(cancel_token)
+        started = time.perf_counter()
+        try:
+            return await self._handle_request(user_input, user_id, session_id, audio_profile, cancel_token)
+        except asyncio.CancelledError:
+            cancel_token.cancel()
+            record_cancellation(cancel_token.stage, time.perf_counter() - started)
+            raise
+
+    async def _handle_request(self, user_input: str, user_id: str, session_id: str, audio_profile: str, cancel_token: CancellationToken) -> dict:
+        session_id = session_id or str(uuid.uuid4())
+        audio_profile = resolve_profile(audio_profile)
         model_name = self.orchestrator.model_name
+        # Filled by the model router with the model each stage actually ran on
+        stage_models = start_stage_recording()
         logger.info(f"Processing request '{user_input}' with model '{model_name}' (Session: {session_id})")
 
         response_text = ""
         action_taken = "adk_pipeline"
-        
+
         with tracer.start_as_current_span("process_request") as span:
             span.set_attribute("session_id", session_id)
-            span.set_attribute("user_id", "user")
+            span.set_attribute("user_id", user_id)
             span.set_attribute("model", model_name)
             span.set_attribute("input", user_input)
+            span.set_attribute("audio_profile", audio_profile)
 
-            try:
-                # Ensure session exists with initial state
-                app_name = getattr(self.runner, "app_name", "default")
-                await self.runner.session_service.create_session(
-                    session_id=session_id, 
-                    user_id="user", 
-                    app_name=app_name,
-                    state={
-                        "current_digest": "",
-                        "critique": ""
+            # Serve a pre-computed digest if the scheduler already built one
+            cached = self.digest_cache.get(user_id, self._cache_query_for(user_input))
+            if cached and cached.get("audio_file") and self.tts_service:
+                try:
+                    cached_stats = cached.get("stats", {})
+                    # Entries from before encoding profiles are MP3
+                    if cached_stats.get("audio_profile", "mp3") == audio_profile:
+                        audio_url = self.tts_service.get_audio_url(cached["audio_file"])
+                    else:
+                        # Same digest, different encoding: only the synthesis is redone
+                        cancel_token.stage = "audio"
+                        with tracer.start_as_current_span("generate_audio"):
+                            audio_url = await asyncio.to_thread(self.tts_service.generate_audio, cached["digest"], audio_profile, cancel_token)
+                    span.set_attribute("digest_cache_hit", True)
+                    logger.info(f"Serving pre-computed digest for '{cached['query']}'")
+                    return {
+                        "response": self._compose_response(user_input, cached["digest"], audio_url),
+                        "session_id": cached_stats.get("session_id", session_id),
+                        "model": model_name,
+                        "models": cached_stats.get("models", {}),
+                        "audio_profile": audio_profile,
+                        "cached": True
                     }
-                )
-
-                # Construct Message
-                class SimplePart:
-                    def __init__(self, text):
-                        self.text = text
-                class SimpleMessage:
-                    def __init__(self, role, content):
-                        self.role = role
-                        self.parts = [SimplePart(content)]
-
-                user_msg = SimpleMessage(role="user", content=user_input)
-
-                # Run Pipeline Async
-                async for event in self.runner.run_async(
-                    user_id="user",
-                    session_id=session_id,
-                    new_message=user_msg
-                ):
-                    # Trace and Log Intermediate Steps
-                    if hasattr(event, "text") and event.text:
-                        response_text = event.text
-                        # Log intermediate text events (potential agent outputs)
-                        if self.cloud_logger:
-                            self.cloud_logger.log_struct({
-                                "session_id": session_id,
-                                "step": "agent_output",
-                                "content": event.text[:1000], # Truncate for log
-                                "timestamp": datetime.now().isoformat()
-                            })
-                    
-                    if hasattr(event, "tool_calls") and event.tool_calls:
-                        logger.info(f"Tool called: {event.tool_calls}")
-                        if self.cloud_logger:
-                            self.cloud_logger.log_struct({
-                                "session_id": session_id,
-                                "step": "tool_call",
-                                "tool_calls": str(event.tool_calls),
-                                "timestamp": datetime.now().isoformat()
-                            })
-                
-                if not response_text:
-                     # Fallback logic (same as before)
-                     session = await self.runner.session_service.get_session(
-                         session_id=session_id,
-                         user_id="user",
-                         app_name=app_name
-                     )
-                     if session and session.events:
-                         for event in reversed(session.events):
-                             if hasattr(event, "actions") and event.actions and hasattr(event.actions, "state_delta"):
-                                 state_delta = event.actions.state_delta
-                                 if state_delta and "current_digest" in state_delta:
-                                     response_text = state_delta["current_digest"]
-                                     logger.info("Found digest in state_delta.")
-                                     break
-                         
-                         if not response_text:
-                             # ... (rest of fallback logic)
-                             for event in reversed(session.events):
-                                 text = ""
-                                 if hasattr(event, "content") and event.content and hasattr(event.content, "parts"):
-                                     for part in event.content.parts:
-                                         if hasattr(part, "text") and part.text:
-                                             text += part.text
-                                 if text:
-                                     if len(text) > 100: 
-                                         response_text = text
-                                         break
-                                     elif not response_text:
-                                         response_text = text
-                
+                except Exception as e:
+                    logger.warning(f"Failed to serve cached digest, rebuilding: {e}")
+
+            try:
+                pipeline_started = time.perf_counter()
+                response_text = await self._run_pipeline(user_input, session_id, user_id=user_id)
+                observe_pipeline_seconds(time.perf_counter() - pipeline_started)
+
                 # Deterministic Audio Generation
                 if response_text:
                     try:
                         logger.info("Generating audio for digest...")
+                        cancel_token.stage = "audio"
                         # Generate audio (run in thread to avoid blocking)
-                        import asyncio
                         with tracer.start_as_current_span("generate_audio"):
-                            audio_url = await asyncio.to_thread(self.tts_service.generate_audio, response_text)
-                            
+                            audio_url = await asyncio.to_thread(self.tts_service.generate_audio, response_text, audio_profile, cancel_token)
+
                             logger.info(f"Audio generated successfully: {audio_url}")
-                            
-                            user_input_lower = user_input.lower()
-                            wants_text = any(keyword in user_input_lower for keyword in ["text", "read", "summary", "bullet", "show me", "written"])
-                            
-                            audio_message = f"\n\n🎧 **[Listen to your Audio Digest Now! (opening in a new browser)]({audio_url})**"
-                            
-                            if wants_text:
-                                response_text += audio_message
-                            else:
-                                response_text = f"I've cooked up a fresh audio digest for you! {audio_message} Please note that the audio digest will be available for 48 hours. \n So don't leave me hanging for too long 😉."
+                            response_text = self._compose_response(user_input, response_text, audio_url)
 
                     except Exception as e:
                         logger.error(f"Failed to generate audio: {e}")
@@ -165,7 +317,7 @@ class ConciergeAgent:
                 response_text = f"I encountered an error: {str(e)}"
                 span.record_exception(e)
                 span.set_status(trace.Status(trace.StatusCode.ERROR))
-                
+
                 # Log failure
                 if self.cloud_logger:
                     self.cloud_logger.log_struct({
@@ -177,6 +329,9 @@ class ConciergeAgent:
                         "status": "error"
                     })
 
+            self._trace_stage_models(span, stage_models)
+            model_name = stage_models.get("drafter", model_name)
+
             # Log Success Session
             if action_taken == "adk_pipeline":
                  try:
@@ -187,6 +342,7 @@ class ConciergeAgent:
                         "response": response_text[:5000],
                         "action": action_taken,
                         "model": model_name,
+                        "models": dict(stage_models),
                         "status": "success"
                     })
                  except Exception as e:
@@ -195,5 +351,7 @@ class ConciergeAgent:
             return {
                 "response": response_text,
                 "session_id": session_id,
-                "model": model_name
+                "model": model_name,
+                "models": dict(stage_models),
+                "audio_profile": audio_profile
             }
@@ -1,22 +1,60 @@
 import logging
 import os.path
 import base64
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import Iterator
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from app.services.rate_governor import get_rate_governor
+from app.services.single_flight import SingleFlight
+from app.services.cancellation import CancellationToken, OperationCancelled, cancellation_stats
+from app.services.lexical_index import get_lexical_index, reciprocal_rank_fusion, tokenize
+from app.services.gmail_query import build_gmail_queries
+from app.services.vector_index import get_vector_index
 
 logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+EMBED_BATCH_SIZE = 100
+
+_search_flight = SingleFlight("semantic_search")
+
+# How each search was answered (lexical_fast_path / hybrid / lexical_fallback) and what it cost
+# in Gmail calls (gmail_pages, messages_fetched, messages_from_index, early_stops)
+retrieval_stats = defaultdict(int)
 
 class EmailAggregator:
-    def __init__(self):
+    def __init__(self, user_id: str = "user"):
         self.creds = None
         self.service = None
+        self.user_id = user_id
+        self.governor = get_rate_governor()
+        self.lexical_index = get_lexical_index()
+        self.vector_index = get_vector_index()
+        self.trash_sync_interval = int(os.getenv("TRASH_SYNC_INTERVAL_SECONDS", "3600"))
+        self._last_trash_sync = 0.0
+        # Lexical fast path: queries of at most N terms with at least M emails matching all of them,
+        # where those matches are at most a LEXICAL_FAST_PATH_MAX_SHARE of the candidate pool
+        self.lexical_max_terms = int(os.getenv("LEXICAL_FAST_PATH_MAX_TERMS", "3"))
+        self.lexical_min_hits = int(os.getenv("LEXICAL_FAST_PATH_MIN_HITS", "3"))
+        self.lexical_max_share = float(os.getenv("LEXICAL_FAST_PATH_MAX_SHARE", "0.5"))
+        # Candidate fetching: request filters are pushed into Gmail's `q` and pages are pulled lazily
+        # until GMAIL_TARGET_CANDIDATES emails score at least CANDIDATE_MIN_SCORE (or GMAIL_MAX_FETCH is hit).
+        self.exclude_categories = [c.strip() for c in os.getenv("GMAIL_EXCLUDE_CATEGORIES", "").split(",") if c.strip()]
+        self.page_size = int(os.getenv("GMAIL_PAGE_SIZE", "50"))
+        self.max_fetch = int(os.getenv("GMAIL_MAX_FETCH", "200"))
+        self.target_candidates = int(os.getenv("GMAIL_TARGET_CANDIDATES", "25"))
+        self.min_candidate_score = float(os.getenv("CANDIDATE_MIN_SCORE", "0.55"))
         self._authenticate()
 
+    def _execute(self, request):
+        """Executes a Gmail API request under the shared rate governor (quota smoothing + 429 retries)."""
+        return self.governor.call("gmail", request.execute, user_id=self.user_id)
+
     def _authenticate(self):
         """Authenticates with Gmail API using token.json."""
         # Look for token.json in likely locations
@@ -72,7 +110,7 @@ class EmailAggregator:
         # Resolve label names to IDs
         label_ids = []
         try:
-            results = self.service.users().labels().list(userId='me').execute()
+            results = self._execute(self.service.users().labels().list(userId='me'))
             gmail_labels = results.get('labels', [])
             
             for requested_label in labels:
@@ -110,33 +148,15 @@ class EmailAggregator:
             query = f"({label_query}) {date_query}"
         
         try:
-            results = self.service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-            messages = results.get('messages', [])
-            
             email_data = []
-            for msg in messages:
-                # Get full message details
-                txt = self.service.users().messages().get(userId='me', id=msg['id']).execute()
-                
-                payload = txt['payload']
-                headers = payload.get('headers', [])
-                
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown Sender")
-                date_str = next((h['value'] for h in headers if h['name'] == 'Date'), "")
-                
-                # Extract body (snippet for now, or full text if needed)
-                snippet = txt.get('snippet', '')
-                
-                email_data.append({
-                    "id": msg['id'],
-                    "subject": subject,
-                    "sender": sender,
-                    "date": date_str,
-                    "body": snippet, # Using snippet for efficiency
-                    "labels": labels # Simplified, actual labels are in txt['labelIds']
-                })
-                
+            for message_ids in self._list_message_ids(query):
+                for msg_id in message_ids[:max_results - len(email_data)]:
+                    email = self._get_email(msg_id)
+                    email["labels"] = labels  # Simplified, actual labels are in label_ids
+                    email_data.append(email)
+                if len(email_data) >= max_results:
+                    break
+
             logger.info(f"Fetched {len(email_data)} emails.")
             return email_data
             
@@ -144,64 +164,245 @@ class EmailAggregator:
             logger.error(f"Error fetching emails: {e}")
             return []
 
-    def semantic_search(self, query: str, days: int = 14, max_results: int = 50) -> list[dict]:
+    def _list_message_ids(self, q: str, cancel_token: CancellationToken = None) -> Iterator[list[str]]:
+        """Yields message ids a page at a time; the next page is only requested if the caller keeps iterating."""
+        page_token = None
+        while True:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            results = self._execute(self.service.users().messages().list(userId='me', q=q, maxResults=self.page_size, pageToken=page_token))
+            retrieval_stats["gmail_pages"] += 1
+            yield [m['id'] for m in results.get('messages', [])]
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+
+    def _get_email(self, msg_id: str, cancel_token: CancellationToken = None) -> dict:
+        """Email dict for a message id; mail already in the vector index needs no messages.get call."""
+        known = self.vector_index.metadata.get(msg_id)
+        if known:
+            retrieval_stats["messages_from_index"] += 1
+            email = dict(known)
+        else:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            # Headers + snippet only; the body isn't used
+            txt = self._execute(self.service.users().messages().get(
+                userId='me', id=msg_id, format='metadata', metadataHeaders=['Subject', 'From', 'Date']
+            ))
+            retrieval_stats["messages_fetched"] += 1
+            headers = txt.get('payload', {}).get('headers', [])
+            email = {
+                "id": msg_id,
+                "subject": next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject"),
+                "sender": next((h['value'] for h in headers if h['name'] == 'From'), "Unknown Sender"),
+                "date": next((h['value'] for h in headers if h['name'] == 'Date'), ""),
+                "body": txt.get('snippet', ''),  # Using snippet for efficiency
+                "labels": [],
+                "label_ids": txt.get('labelIds', []),
+                # Epoch millis from Gmail; used for date pre-filtering in the vector index
+                "timestamp": int(txt.get('internalDate', 0)) / 1000
+            }
+        # Keep the lexical index in sync with everything we fetch
+        if msg_id not in self.lexical_index:
+            self.lexical_index.add(msg_id, {"subject": email.get("subject", ""), "sender": email.get("sender", ""), "body": email.get("body", "")})
+        return email
+
+    def _candidate_pages(self, query: str, days: int, cancel_token: CancellationToken = None) -> Iterator[list[dict]]:
+        """
+        Lazily yields pages of candidate emails for a request: first the Gmail query with its
+        keywords/sender/category pushed down, then broader passes down to a date-only query. Stops at GMAIL_MAX_FETCH.
+        Checks `cancel_token` before every Gmail call.
+        """
+        if not self.service:
+            logger.error("Gmail service not initialized. Cannot fetch emails.")
+            return
+        seen = set()
+        try:
+            for q in build_gmail_queries(query, days, self.exclude_categories):
+                logger.info(f"Fetching candidates with Gmail query: {q}")
+                for message_ids in self._list_message_ids(q, cancel_token):
+                    message_ids = [m for m in message_ids if m not in seen][:self.max_fetch - len(seen)]
+                    seen.update(message_ids)
+                    if message_ids:
+                        yield [self._get_email(msg_id, cancel_token) for msg_id in message_ids]
+                    if len(seen) >= self.max_fetch:
+                        return
+        except OperationCancelled:
+            cancellation_stats["gmail_fetches_aborted"] += 1
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching emails: {e}")
+
+    def semantic_search(self, query: str, days: int = 14, max_results: int = 50, label_ids: list[str] = None, cancel_token: CancellationToken = None) -> list[dict]:
+        """
+        Performs semantic search using Gemini embeddings over the persistent email index.
+        `days` and `label_ids` pre-filter the index; they do not limit it to the latest fetch.
+        Identical concurrent searches share one Gmail fetch + embedding pass.
+        Raises OperationCancelled once `cancel_token` is cancelled (checked between Gmail calls and embedding batches).
+        """
+        key = (self.user_id, " ".join(query.lower().split()), days, max_results, tuple(label_ids or ()))
+        return _search_flight.do(key, self._semantic_search, query, days, max_results, label_ids, cancel_token)
+
+    def _semantic_search(self, query: str, days: int = 14, max_results: int = 50, label_ids: list[str] = None, cancel_token: CancellationToken = None) -> list[dict]:
+        # 1. Page through Gmail lazily (request filters pushed into `q`), scoring each page as it
+        # arrives: candidates that match every query term or are semantically close count as strong.
+        # Stop paging once there are enough strong candidates; older mail reaches the persistent index
+        # through the EmailIngestor backfill/sync when ENABLE_EMAIL_INGESTION is on (app/services/email_ingestor.py).
+        pool = {}
+        strong = set()
+        lexical_ranking = []
+        query_vector = None
+        embeddings_ok = self._embeddings_ready()
+        self._sync_trash()
+        if embeddings_ok:
+            # Pick up embeddings other workers already paid for
+            self.vector_index.refresh()
+
+        pages = self._candidate_pages(query, days, cancel_token)
+        try:
+            for page in pages:
+                pool.update((e['id'], e) for e in page)
+                page_ids = [e['id'] for e in page]
+
+                # 2. Lexical fast path: keyword-style queries ("Verge", "project updates") don't need embeddings
+                lexical_ranking = [doc_id for doc_id, _ in self.lexical_index.search(query, candidate_ids=list(pool))]
+                if not label_ids and self._lexical_confident(query, lexical_ranking, len(pool)):
+                    retrieval_stats["lexical_fast_path"] += 1
+                    logger.info(f"Lexical fast path: {len(lexical_ranking)} keyword matches, skipping embeddings.")
+                    return [pool[doc_id] for doc_id in lexical_ranking[:max_results]]
+
+                strong.update(self.lexical_index.full_matches(query, page_ids))
+                if embeddings_ok:
+                    try:
+                        self._index_embeddings(page, cancel_token)
+                        if query_vector is None:
+                            query_vector = self._embed(query, "retrieval_query")
+                        scores = self.vector_index.scores(query_vector, page_ids)
+                        strong.update(doc_id for doc_id, score in scores.items() if score >= self.min_candidate_score)
+                    except OperationCancelled:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error in semantic search: {e}")
+                        embeddings_ok = False
+
+                if len(strong) >= self.target_candidates:
+                    retrieval_stats["early_stops"] += 1
+                    logger.info(f"{len(strong)} strong candidates in {len(pool)} fetched emails, stopping Gmail paging.")
+                    break
+        finally:
+            pages.close()
+
+        # 3. Vector ranking over the whole indexed mailbox, pre-filtered by date (and labels)
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+        if embeddings_ok and query_vector is None:
+            try:
+                query_vector = self._embed(query, "retrieval_query")
+            except Exception as e:
+                logger.error(f"Error in semantic search: {e}")
+        vector_ranking = self._vector_ranking(query_vector, days, max(max_results, 50), label_ids) if query_vector is not None else None
+        if vector_ranking is None:
+            if not pool:
+                return []
+            # Embedding API slow/unavailable: keyword matches first, then the rest by recency.
+            retrieval_stats["lexical_fallback"] += 1
+            matched = set(lexical_ranking)
+            ranking = lexical_ranking + [doc_id for doc_id in pool if doc_id not in matched]
+        else:
+            retrieval_stats["hybrid"] += 1
+            for doc_id in vector_ranking:
+                if doc_id not in pool and doc_id in self.vector_index.metadata:
+                    email = pool[doc_id] = self.vector_index.metadata[doc_id]
+                    if doc_id not in self.lexical_index:
+                        self.lexical_index.add(doc_id, {"subject": email.get("subject", ""), "sender": email.get("sender", ""), "body": email.get("body", "")})
+            # 4. Fuse with the lexical ranking over the same pool (reciprocal rank fusion)
+            lexical_ranking = [doc_id for doc_id, _ in self.lexical_index.search(query, candidate_ids=list(pool))]
+            ranking = reciprocal_rank_fusion([lexical_ranking, vector_ranking]) if lexical_ranking else vector_ranking
+
+        # Return top N
+        top_emails = [pool[doc_id] for doc_id in ranking[:max_results] if doc_id in pool]
+        logger.info(f"Found {len(top_emails)} relevant emails.")
+        return top_emails
+
+    def _lexical_confident(self, query: str, lexical_ranking: list[str], pool_size: int) -> bool:
         """
-        Performs semantic search on recent emails using Gemini embeddings.
+        Short keyword queries where enough emails contain every query term, and those emails stand
+        out from the pool. Pages from the keyword-filtered Gmail query nearly all match, and a
+        match that almost everything shares says nothing about relevance.
         """
+        terms = tokenize(query)
+        if not terms or len(terms) > self.lexical_max_terms:
+            return False
+        hits = self.lexical_index.full_match_count(query, lexical_ranking)
+        return hits >= self.lexical_min_hits and hits <= self.lexical_max_share * pool_size
+
+    def _embed(self, contents, task_type: str):
         import google.generativeai as genai
-        import numpy as np
-        
+
+        return self.governor.call(
+            "gemini",
+            genai.embed_content,
+            user_id=self.user_id,
+            model="models/text-embedding-004",
+            content=contents,
+            task_type=task_type
+        )['embedding']
+
+    def _embeddings_ready(self) -> bool:
         # Ensure API key is set
         if not os.getenv("GOOGLE_API_KEY"):
             logger.error("GOOGLE_API_KEY not found. Cannot perform semantic search.")
-            return []
-            
+            return False
+        import google.generativeai as genai
+
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        
-        # 1. Fetch a broad set of recent emails (e.g., last 14 days, max 50)
-        # Use a broad search to get candidates. Shall revisit this logic after initiatl user adoption and usages are observed.
-        candidates = self.fetch_emails(labels=[], days=days, max_results=50)
-        
-        if not candidates:
-            return []
-            
-        logger.info(f"Ranking {len(candidates)} emails for query: '{query}'")
-        
+        return True
+
+    def _index_embeddings(self, emails: list[dict], cancel_token: CancellationToken = None):
+        """Embeds emails the index hasn't seen (Subject + Snippet), in API-sized batches."""
+        new_emails = [e for e in emails if e['id'] not in self.vector_index]
+        for start in range(0, len(new_emails), EMBED_BATCH_SIZE):
+            if cancel_token and cancel_token.cancelled:
+                cancellation_stats["embeddings_skipped"] += len(new_emails) - start
+                cancel_token.raise_if_cancelled()
+            batch = new_emails[start:start + EMBED_BATCH_SIZE]
+            embeddings = self._embed([f"Subject: {e['subject']}\nSnippet: {e['body']}" for e in batch], "retrieval_document")
+            self.vector_index.add(
+                [e['id'] for e in batch],
+                embeddings,
+                [e.get('timestamp') or time.time() for e in batch],
+                labels=[e.get('label_ids', []) for e in batch],
+                metadata=[{k: v for k, v in e.items() if k != 'label_ids'} for e in batch]
+            )
+        if new_emails:
+            logger.info(f"Indexed {len(new_emails)} new emails ({len(self.vector_index)} total).")
+
+    def _vector_ranking(self, query_vector, days: int, k: int, label_ids: list[str] = None) -> list[str] | None:
+        """
+        Searches the ANN index over the whole indexed mailbox, pre-filtered by date (and labels).
+        Returns None on failure, so callers can fall back to lexical ranking.
+        """
         try:
-            # 2. Embed the query
-            query_embedding = genai.embed_content(
-                model="models/text-embedding-004",
-                content=query,
-                task_type="retrieval_query"
-            )['embedding']
-            
-            # 3. Embed the candidates (Subject + Snippet)
-            # Batching could be added here if needed, for the time being, as long as <50, keep it as it is. 
-            candidate_texts = [f"Subject: {e['subject']}\nSnippet: {e['body']}" for e in candidates]
-            
-            candidate_embeddings = genai.embed_content(
-                model="models/text-embedding-004",
-                content=candidate_texts,
-                task_type="retrieval_document"
-            )['embedding']
-            
-            # 4. Calculate Cosine Similarity
-            def cosine_similarity(v1, v2):
-                return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-                
-            scored_emails = []
-            for i, email in enumerate(candidates):
-                score = cosine_similarity(query_embedding, candidate_embeddings[i])
-                scored_emails.append((score, email))
-            
-            # 5. Sort and Filter
-            scored_emails.sort(key=lambda x: x[0], reverse=True)
-            
-            # Return top N
-            top_emails = [email for score, email in scored_emails[:max_results]]
-            logger.info(f"Found {len(top_emails)} relevant emails.")
-            return top_emails
-            
+            since = (datetime.now() - timedelta(days=days)).timestamp() if days else None
+            hits = self.vector_index.search(query_vector, k=k, since=since, labels=label_ids)
+            return [doc_id for doc_id, score in hits]
         except Exception as e:
             logger.error(f"Error in semantic search: {e}")
-            return []
+            return None
+
+    def _sync_trash(self):
+        """Drops trashed mail from the indexes (at most once per TRASH_SYNC_INTERVAL_SECONDS)."""
+        if not self.service or time.monotonic() - self._last_trash_sync < self.trash_sync_interval:
+            return
+        self._last_trash_sync = time.monotonic()
+        try:
+            results = self._execute(self.service.users().messages().list(userId='me', q="in:trash", maxResults=500))
+            trashed = [m['id'] for m in results.get('messages', [])]
+            removed = self.vector_index.remove(trashed)
+            for doc_id in trashed:
+                self.lexical_index.remove(doc_id)
+            if removed:
+                logger.info(f"Removed {removed} trashed emails from the vector index.")
+        except Exception as e:
+            logger.error(f"Failed to sync trashed emails: {e}")
@@ -0,0 +1,51 @@
+import logging
+import time
+from typing import AsyncGenerator
+
+from google.adk.models import Gemini
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from app.services.model_router import get_model_router
+from app.services.rate_governor import get_rate_governor
+
+logger = logging.getLogger(__name__)
+
+
+class GovernedGemini(Gemini):
+    """
+    Gemini model for ADK LlmAgents whose calls go through the shared RateGovernor,
+    so 429 / RESOURCE_EXHAUSTED responses are smoothed and retried instead of failing the request.
+
+    With a `stage`, each attempt's latency and outcome are reported to the ModelRouter, which picks
+    the model per call (`llm_request.model`) in the agent's before_model_callback.
+    """
+
+    stage: str | None = None
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        parent_generate = super().generate_content_async
+        model = llm_request.model or self.model
+
+        async def attempt():
+            # Started by the governor once admitted: token-bucket waits, concurrency queueing, retry
+            # backoff and RateLimitExceeded rejections are client-side and don't count against the model.
+            started = time.perf_counter()
+            try:
+                async for response in parent_generate(llm_request, stream):
+                    yield response
+            except Exception:
+                self._record(model, started, failed=True)
+                raise
+            self._record(model, started, failed=False)
+
+        async for response in get_rate_governor().astream("llm", attempt):
+            yield response
+
+    def _record(self, model: str, started: float, failed: bool):
+        if self.stage:
+            get_model_router().record(self.stage, model, time.perf_counter() - started, failed=failed)
+
+
+def build_model(model_name: str, stage: str = None) -> GovernedGemini:
+    return GovernedGemini(model=model_name, stage=stage)
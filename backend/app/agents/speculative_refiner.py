@@ -0,0 +1,103 @@
+import json
+import logging
+import re
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent, LlmAgent, ParallelAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+logger = logging.getLogger(__name__)
+
+# Each parallel drafter gets its own temperature and structural angle so the Judge has real alternatives.
+STYLE_SEEDS = [
+    "Lead with the single most consequential story, then run through quick hits.",
+    "Open with a wry observation that ties the stories together, then go story by story.",
+    "For each story: what happened, why it matters, what to watch next.",
+    "Keep it tight: three short paragraphs of punchy, conversational sentences.",
+    "Frame it as a conversation with a smart friend who missed the week's news.",
+]
+TEMPERATURES = [0.4, 0.8, 1.1, 0.6, 1.3]
+
+VERDICT_KEY = "verdict"
+
+
+def draft_key(index: int) -> str:
+    return f"draft_{index}"
+
+
+def parse_verdict(text: str, num_drafts: int) -> dict:
+    """
+    Reads the Judge's JSON verdict ({"best": n, "approved": bool, "fix": "..."}), tolerating
+    code fences and surrounding prose. Falls back to approving draft 1.
+    """
+    verdict = {"best": 1, "approved": True, "fix": ""}
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        logger.warning("Judge returned no JSON verdict; keeping draft 1.")
+        return verdict
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        logger.warning(f"Could not parse Judge verdict, keeping draft 1: {e}")
+        return verdict
+    try:
+        verdict["best"] = min(max(int(data.get("best", 1)), 1), num_drafts)
+    except (TypeError, ValueError):
+        pass
+    verdict["fix"] = str(data.get("fix") or "").strip()
+    verdict["approved"] = bool(data.get("approved", not verdict["fix"])) or not verdict["fix"]
+    return verdict
+
+
+class SpeculativeRefiner(BaseAgent):
+    """
+    Alternative to the serial Drafter -> Critic RefinementLoop (up to 6 sequential LLM calls).
+
+    Round trip 1: K drafters run concurrently (different temperatures / style seeds), then a
+    single Judge call scores them and either approves the best one or asks for one targeted fix.
+    Round trip 2 (only if a fix was requested): the Fixer applies it; the result is not re-reviewed.
+    So a digest takes at most 2 round trips (3 sequential LLM calls), at the price of K parallel drafts.
+    """
+
+    draft_panel: ParallelAgent
+    judge: LlmAgent
+    fixer: LlmAgent
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def __init__(self, name: str, draft_panel: ParallelAgent, judge: LlmAgent, fixer: LlmAgent):
+        super().__init__(
+            name=name,
+            draft_panel=draft_panel,
+            judge=judge,
+            fixer=fixer,
+            sub_agents=[draft_panel, judge, fixer],
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        # Round trip 1: speculative drafts in parallel, then one Judge call over all of them.
+        async for event in self.draft_panel.run_async(ctx):
+            yield event
+        async for event in self.judge.run_async(ctx):
+            yield event
+
+        state = ctx.session.state
+        drafts = [state.get(draft_key(i), "") or "" for i in range(len(self.draft_panel.sub_agents))]
+        verdict = parse_verdict(state.get(VERDICT_KEY, ""), len(drafts))
+        chosen = drafts[verdict["best"] - 1] or next((d for d in drafts if d), "")
+        critique = "" if verdict["approved"] else verdict["fix"]
+        logger.info(f"Judge picked draft {verdict['best']}/{len(drafts)} ({'approved' if not critique else 'fix requested'})")
+
+        # Publish the pick as the digest; the Fixer (and the concierge fallback) read current_digest.
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={"current_digest": chosen, "critique": critique}),
+        )
+
+        # Round trip 2: one targeted fix, only when the Judge asked for it.
+        if critique:
+            async for event in self.fixer.run_async(ctx):
+                yield event
@@ -0,0 +1,103 @@
+import logging
+import os
+import re
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Encoding profiles for synthesized digests. "encoding" is a texttospeech.AudioEncoding name.
+# Google TTS picks the Opus bitrate from the sample rate, so the sample rate is the size knob.
+AUDIO_PROFILES = {
+    # Speech-grade Opus: much smaller than MP3 at the same intelligibility.
+    "speech": {"encoding": "OGG_OPUS", "sample_rate_hz": 24000, "speaking_rate": 1.0, "content_type": "audio/ogg", "extension": "ogg"},
+    # Narrowband Opus, slightly faster delivery, tuned for phone speakers.
+    "compact": {"encoding": "OGG_OPUS", "sample_rate_hz": 16000, "speaking_rate": 1.1, "content_type": "audio/ogg", "extension": "ogg",
+                "effects_profile": "handset-class-device"},
+    # Plays everywhere; used for clients that can't play Ogg Opus.
+    "mp3": {"encoding": "MP3", "sample_rate_hz": 24000, "speaking_rate": 1.0, "content_type": "audio/mpeg", "extension": "mp3"},
+}
+FALLBACK_PROFILE = "mp3"
+
+# WebKit (Safari, every iOS browser) can't reliably play Ogg Opus. Chrome's UA also says "Safari",
+# but only Safari puts "Version/x" right before it.
+OPUS_UNSUPPORTED_RE = re.compile(r"iPhone|iPad|iPod|Version/[\d.]+ (?:Mobile/\w+ )?Safari")
+
+# Journey voices ignore speaking rate (the API rejects it).
+FIXED_RATE_VOICES = ("Journey",)
+
+
+def default_profile() -> str:
+    name = os.getenv("AUDIO_PROFILE", "speech")
+    if name not in AUDIO_PROFILES:
+        logger.warning(f"Unknown AUDIO_PROFILE '{name}', using '{FALLBACK_PROFILE}'")
+        return FALLBACK_PROFILE
+    return name
+
+
+def resolve_profile(requested: str = None, user_agent: str = None) -> str:
+    """
+    Picks the profile name for a request: an explicit (known) profile wins, otherwise the
+    AUDIO_PROFILE default, downgraded to MP3 for clients that can't play Ogg Opus.
+    """
+    if requested:
+        if requested in AUDIO_PROFILES:
+            return requested
+        logger.warning(f"Unknown audio profile '{requested}', using the default")
+    name = default_profile()
+    if user_agent and AUDIO_PROFILES[name]["encoding"] == "OGG_OPUS" and OPUS_UNSUPPORTED_RE.search(user_agent):
+        return FALLBACK_PROFILE
+    return name
+
+
+def supports_speaking_rate(voice_name: str) -> bool:
+    return not any(marker in voice_name for marker in FIXED_RATE_VOICES)
+
+
+# --- Duration (for metadata and per-minute benchmark figures) ---
+
+_MP3_BITRATES_KBPS = {
+    "mpeg1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "mpeg2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+
+
+def _ogg_opus_duration(data: bytes) -> float | None:
+    # The last page's granule position counts 48 kHz samples, including the encoder pre-skip.
+    head = data.find(b"OpusHead")
+    last = data.rfind(b"OggS")
+    if head < 0 or last < 0:
+        return None
+    pre_skip = struct.unpack_from("<H", data, head + 10)[0]
+    granule = struct.unpack_from("<q", data, last + 6)[0]
+    return max(0, granule - pre_skip) / 48000
+
+
+def _mp3_duration(data: bytes) -> float | None:
+    # Constant bitrate (what TTS returns): duration = audio bytes / bitrate of the first frame.
+    offset = 0
+    if data[:3] == b"ID3":
+        size = data[6] << 21 | data[7] << 14 | data[8] << 7 | data[9]
+        offset = 10 + size
+    while offset < len(data) - 4:
+        if data[offset] == 0xFF and data[offset + 1] & 0xE0 == 0xE0:
+            break
+        offset += 1
+    else:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    kbps = _MP3_BITRATES_KBPS["mpeg1" if version == 3 else "mpeg2"][data[offset + 2] >> 4]
+    if not kbps:
+        return None
+    return (len(data) - offset) * 8 / (kbps * 1000)
+
+
+def audio_duration_seconds(data: bytes, encoding: str) -> float | None:
+    """Playback length of synthesized audio, or None if it can't be read from the bytes."""
+    try:
+        if encoding == "OGG_OPUS":
+            return _ogg_opus_duration(data)
+        if encoding == "MP3":
+            return _mp3_duration(data)
+    except (IndexError, struct.error):
+        pass
+    return None
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from app.services.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+# Audio digests are advertised to users as available for 48 hours.
+DEFAULT_RETENTION_SECONDS = 48 * 3600
+REAPER_LEASE = "audio_reaper"
+
+
+class AudioStorage(ABC):
+    """
+    Where synthesized audio digests live. Implementations: GCS (default) and local disk.
+    """
+
+    @abstractmethod
+    def save(self, filename: str, data: bytes, content_type: str = "audio/mpeg", metadata: dict | None = None):
+        """Stores an audio object under `filename`."""
+
+    @abstractmethod
+    def url_for(self, filename: str) -> str:
+        """Returns a URL the client can play/download the object from."""
+
+    @abstractmethod
+    def delete(self, filename: str):
+        """Removes an object (missing objects are ignored)."""
+
+    @abstractmethod
+    def reap(self, max_age_seconds: int = DEFAULT_RETENTION_SECONDS) -> int:
+        """Deletes objects older than `max_age_seconds`. Returns how many were removed."""
+
+
+class GCSAudioStorage(AudioStorage):
+    def __init__(self, bucket_name: str = None, signed_url_expiration: int = 3600):
+        from google.cloud import storage
+
+        self.bucket_name = bucket_name or os.getenv("GCS_BUCKET_NAME", "albert-audio-assets-mvp")
+        self.signed_url_expiration = signed_url_expiration
+        self.storage_client = storage.Client()
+        self.bucket = self.storage_client.bucket(self.bucket_name)
+
+    def save(self, filename: str, data: bytes, content_type: str = "audio/mpeg", metadata: dict | None = None):
+        logger.info(f"Uploading audio to GCS bucket: {self.bucket_name}")
+        blob = self.bucket.blob(filename)
+        if metadata:
+            blob.metadata = metadata
+        blob.upload_from_string(data, content_type=content_type)
+
+    def url_for(self, filename: str) -> str:
+        # Signed URLs work without changing bucket IAM; a public podcast could use a public bucket instead.
+        blob = self.bucket.blob(filename)
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=self.signed_url_expiration,
+            method="GET"
+        )
+
+    def delete(self, filename: str):
+        try:
+            self.bucket.blob(filename).delete()
+        except Exception as e:
+            logger.warning(f"Failed to delete gs://{self.bucket_name}/{filename}: {e}")
+
+    def reap(self, max_age_seconds: int = DEFAULT_RETENTION_SECONDS) -> int:
+        # A bucket lifecycle rule is cheaper, but this keeps retention enforced without extra setup.
+        # The bucket may be shared: only digests written by save() (tagged with their audio profile) are removed.
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+        removed = 0
+        for blob in self.storage_client.list_blobs(self.bucket_name):
+            if not (blob.metadata or {}).get("audio_profile"):
+                continue
+            if blob.time_created and blob.time_created < cutoff:
+                self.delete(blob.name)
+                removed += 1
+        return removed
+
+
+class LocalAudioStorage(AudioStorage):
+    """
+    Stores audio under `static/audio` and serves it through the `/download/{filename}` route.
+    Also a local stand-in for GCS in tests.
+    """
+
+    def __init__(self, directory: str = None, base_url: str = None):
+        self.directory = directory or os.getenv("LOCAL_AUDIO_DIR", os.path.join("static", "audio"))
+        self.base_url = (base_url or os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")).rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, filename: str) -> str:
+        # Reject path traversal: only plain file names are valid object keys.
+        if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+            raise ValueError(f"Invalid audio filename: {filename!r}")
+        return os.path.join(self.directory, filename)
+
+    def _metadata_path(self, filename: str) -> str:
+        return os.path.join(self.directory, f".{filename}.json")
+
+    def save(self, filename: str, data: bytes, content_type: str = "audio/mpeg", metadata: dict | None = None):
+        path = self.path_for(filename)
+        tmp_path = f"{path}.tmp"
+        # Write then rename, so the download route never serves a half-written file.
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if metadata:
+            with open(self._metadata_path(filename), 'w') as f:
+                json.dump({"content_type": content_type, **metadata}, f)
+        logger.info(f"Saved audio locally: {path}")
+
+    def get_metadata(self, filename: str) -> dict:
+        try:
+            with open(self._metadata_path(filename), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def url_for(self, filename: str) -> str:
+        return f"{self.base_url}/download/{filename}"
+
+    def delete(self, filename: str):
+        for path in (self.path_for(filename), self._metadata_path(filename)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def reap(self, max_age_seconds: int = DEFAULT_RETENTION_SECONDS) -> int:
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        self.delete(entry.name)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+def create_audio_storage() -> AudioStorage:
+    """Picks the storage backend from AUDIO_STORAGE_BACKEND ("gcs" or "local")."""
+    backend = os.getenv("AUDIO_STORAGE_BACKEND", "gcs").lower()
+    if backend == "local":
+        return LocalAudioStorage()
+    return GCSAudioStorage()
+
+
+_storage: AudioStorage | None = None
+_storage_lock = threading.Lock()
+
+
+def get_audio_storage() -> AudioStorage:
+    """Process-wide storage instance shared by the TTS service, download route and reaper."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_audio_storage()
+    return _storage
+
+
+async def run_reaper(storage: AudioStorage, retention_seconds: int = None, interval_seconds: int = None, store=None):
+    """
+    Background task that periodically enforces audio retention. Every worker starts one; a lease
+    in the shared store lets only one of them reap per interval.
+    """
+    retention_seconds = retention_seconds or int(os.getenv("AUDIO_RETENTION_SECONDS", str(DEFAULT_RETENTION_SECONDS)))
+    interval_seconds = interval_seconds or int(os.getenv("AUDIO_REAPER_INTERVAL_SECONDS", "3600"))
+    store = store or get_shared_store()
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            if not store.acquire_lease(REAPER_LEASE, owner, interval_seconds):
+                await asyncio.sleep(interval_seconds)
+                continue
+            removed = await asyncio.to_thread(storage.reap, retention_seconds)
+            if removed:
+                logger.info(f"Audio reaper removed {removed} expired file(s)")
+        except Exception as e:
+            logger.error(f"Audio reaper failed: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,75 @@
+import contextvars
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# What cancellation saved: requests cancelled (per stage), Gmail/embedding/TTS/upload work skipped,
+# and pipeline_seconds_saved (average pipeline time minus time already spent when cancelled).
+cancellation_stats = defaultdict(int)
+
+# Running average of completed pipeline runs, the baseline for pipeline_seconds_saved
+_pipeline_seconds = {"mean": 0.0, "count": 0}
+_lock = threading.Lock()
+
+
+class OperationCancelled(Exception):
+    """Raised by cooperative checks once the work's CancellationToken is cancelled."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for blocking work running in threads (Gmail paging, embedding,
+    TTS), which asyncio task cancellation can't interrupt. The owner calls `cancel()`; the
+    work calls `raise_if_cancelled()` between units (pages, batches, synthesis and upload).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        # Request stage the owner is in ("pipeline" / "audio"), for the per-stage counters
+        self.stage = "pipeline"
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+# Token of the request being processed, for code reached through ADK (tools) that can't take it as an argument.
+_current_token: contextvars.ContextVar[CancellationToken | None] = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def set_cancellation_token(token: CancellationToken):
+    _current_token.set(token)
+
+
+def current_cancellation_token() -> CancellationToken | None:
+    return _current_token.get()
+
+
+def observe_pipeline_seconds(seconds: float):
+    with _lock:
+        _pipeline_seconds["count"] += 1
+        _pipeline_seconds["mean"] += (seconds - _pipeline_seconds["mean"]) / _pipeline_seconds["count"]
+
+
+def record_cancellation(stage: str, elapsed_seconds: float):
+    """Counts a cancelled request; a pipeline cut short saves roughly the rest of an average run."""
+    cancellation_stats["requests_cancelled"] += 1
+    cancellation_stats[f"cancelled_in_{stage}"] += 1
+    if stage == "pipeline":
+        with _lock:
+            saved = max(0.0, _pipeline_seconds["mean"] - elapsed_seconds)
+        cancellation_stats["pipeline_seconds_saved"] += saved
+    logger.info(f"Request cancelled during {stage} after {elapsed_seconds:.1f}s")
+
+
+def cancellation_metrics() -> dict:
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in cancellation_stats.items()}
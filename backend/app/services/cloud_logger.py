@@ -2,8 +2,6 @@ import logging
 import os
 import json
 from datetime import datetime
-from google.cloud import logging as cloud_logging
-from google.oauth2 import service_account
 
 # Configure local logger for fallback
 logger = logging.getLogger(__name__)
@@ -18,6 +16,10 @@ class CloudLogger:
 
         try:
             if os.path.exists(self.creds_path):
+                # Imported lazily: only needed when Cloud Logging credentials are configured.
+                from google.cloud import logging as cloud_logging
+                from google.oauth2 import service_account
+
                 creds = service_account.Credentials.from_service_account_file(self.creds_path)
                 self.client = cloud_logging.Client(project=self.project_id, credentials=creds)
                 self.logger = self.client.logger(self.log_name)
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from app.services.rate_governor import get_rate_governor
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting/stats.
+    return len(text or "") // 4
+
+
+class ContextCacheBackend(ABC):
+    """Creates model-side cached-content handles for a stable prompt prefix."""
+
+    @abstractmethod
+    def create(self, model: str, system_instruction: str, tools=None, ttl_seconds: int = 600) -> str | None:
+        """Returns a cached-content name, or None if caching is unavailable for this request."""
+
+
+class GeminiContextCache(ContextCacheBackend):
+    """Gemini explicit context caching (`client.caches.create`)."""
+
+    def __init__(self):
+        from google import genai
+        from google.genai import types
+
+        self.types = types
+        self.client = genai.Client()
+
+    def create(self, model: str, system_instruction: str, tools=None, ttl_seconds: int = 600) -> str | None:
+        config = self.types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            tools=tools or None,
+            ttl=f"{ttl_seconds}s",
+            display_name="albert-refinement-prefix",
+        )
+        cache = get_rate_governor().call("gemini", self.client.caches.create, model=model, config=config)
+        return cache.name
+
+
+class FakeContextCache(ContextCacheBackend):
+    """Offline stand-in: hands out fake handles and remembers what was cached."""
+
+    def __init__(self):
+        self.created: dict[str, dict] = {}
+
+    def create(self, model: str, system_instruction: str, tools=None, ttl_seconds: int = 600) -> str | None:
+        name = f"cachedContents/fake-{len(self.created) + 1}"
+        self.created[name] = {"model": model, "tokens": estimate_tokens(system_instruction), "tools": tools}
+        return name
+
+
+class PromptPrefixCache:
+    """
+    Puts the stable prefix of a RefinementLoop turn (system instructions + email context)
+    into a cached-content handle and sends only the draft/critique deltas on each iteration.
+
+    Use `callback(...)` as an LlmAgent `before_model_callback`. Hit rates and token savings
+    are tracked per call, so they can be checked offline with FakeContextCache.
+    """
+
+    def __init__(self, backend: ContextCacheBackend = None, ttl_seconds: int = None, min_tokens: int = None):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds or int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "600"))
+        # Gemini rejects caches below a model-specific minimum (1024 tokens for 2.5 Flash).
+        self.min_tokens = min_tokens if min_tokens is not None else int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+        self._handles: dict[str, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._create_locks: dict[str, threading.Lock] = {}
+        self._disabled_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.prompt_tokens_sent = 0
+        self.prompt_tokens_saved = 0
+        self.calls: list[dict] = []
+
+    @staticmethod
+    def _key(model: str, system_instruction: str, tools) -> str:
+        digest = hashlib.sha256()
+        digest.update(model.encode())
+        digest.update(system_instruction.encode())
+        digest.update(repr(tools).encode())
+        return digest.hexdigest()
+
+    @contextmanager
+    def _creation_lock(self, key: str):
+        while True:
+            with self._lock:
+                lock = self._create_locks.setdefault(key, threading.Lock())
+            lock.acquire()
+            with self._lock:
+                # Unheld locks of expired prefixes are pruned; retry if ours was dropped meanwhile.
+                if self._create_locks.get(key) is lock:
+                    break
+            lock.release()
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def get_handle(self, model: str, system_instruction: str, tools=None) -> str | None:
+        if self.backend is None or time.monotonic() < self._disabled_until:
+            return None
+        if estimate_tokens(system_instruction) < self.min_tokens:
+            self.skipped += 1
+            return None
+
+        key = self._key(model, system_instruction, tools)
+        # One creation per prefix: parallel drafters missing at once wait for the first one's handle.
+        with self._creation_lock(key):
+            now = time.monotonic()
+            if now < self._disabled_until:
+                return None
+            with self._lock:
+                cached = self._handles.get(key)
+                # Refresh a little before the server-side TTL runs out.
+                if cached and cached[1] > now + 5:
+                    self.hits += 1
+                    return cached[0]
+
+            try:
+                name = self.backend.create(model, system_instruction, tools=tools, ttl_seconds=self.ttl_seconds)
+            except Exception as e:
+                # Backend/model doesn't support caching (or quota): fall back to full prompts for a while.
+                logger.warning(f"Context cache unavailable, sending full prompts: {e}")
+                self._disabled_until = time.monotonic() + 300
+                return None
+            if not name:
+                return None
+            with self._lock:
+                self.misses += 1
+                self._handles[key] = (name, now + self.ttl_seconds)
+                self._handles = {k: v for k, v in self._handles.items() if v[1] > now}
+                self._create_locks = {k: v for k, v in self._create_locks.items() if k in self._handles or v.locked()}
+            return name
+
+    def callback(self, delta_keys: dict[str, str], fixed: dict[str, str] = None):
+        """
+        Builds a before_model_callback. `delta_keys` maps a label shown to the model
+        (e.g. "Current Draft") to the session state key holding the changing value;
+        `fixed` adds labelled literal lines (e.g. a per-drafter "Style Seed") ahead of them.
+        The user's message for this invocation always leads the delta as "Request", since the
+        rewrite replaces the contents it would otherwise have been sent in.
+        """
+        from google.genai import types
+
+        async def before_model(callback_context, llm_request):
+            config = llm_request.config
+            system_instruction = config.system_instruction if config else None
+            if not isinstance(system_instruction, str) or not system_instruction:
+                return None
+
+            state = callback_context.state
+            user_content = callback_context.user_content
+            request = " ".join(p.text for p in (user_content.parts or []) if p.text) if user_content else ""
+            lines = [f"Request: {request}"] if request else []
+            lines += [f"{label}: {value}" for label, value in (fixed or {}).items()]
+            lines += [f"{label}: {state.get(key, '') or ''}" for label, key in delta_keys.items()]
+            delta = "\n\n".join(lines)
+            # Keep only this turn's tool call/response parts (e.g. Critic -> exit_loop); history is in the prefix.
+            tool_turns = [
+                c for c in (llm_request.contents or [])
+                if c.parts and any(p.function_call or p.function_response for p in c.parts)
+            ]
+            llm_request.contents = [types.Content(role="user", parts=[types.Part(text=delta)])] + tool_turns
+
+            handle = await asyncio.to_thread(self.get_handle, llm_request.model, system_instruction, config.tools)
+            prefix_tokens = estimate_tokens(system_instruction)
+            sent = estimate_tokens(delta)
+            if handle:
+                # Cached content carries the system instruction and tools; the request may not repeat them.
+                config.cached_content = handle
+                config.system_instruction = None
+                config.tools = None
+                config.tool_config = None
+                self.prompt_tokens_saved += prefix_tokens
+            else:
+                sent += prefix_tokens
+            self.prompt_tokens_sent += sent
+            self.calls.append({"agent": callback_context.agent_name, "cached": bool(handle), "prompt_tokens": sent})
+            self.calls = self.calls[-100:]
+            return None
+
+        return before_model
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_below_min_tokens": self.skipped,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "prompt_tokens_sent": self.prompt_tokens_sent,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "recent_calls": self.calls[-12:],
+        }
+
+
+def create_context_cache_backend() -> ContextCacheBackend | None:
+    """CONTEXT_CACHE_BACKEND: "gemini" (default), "fake" (offline) or "none"."""
+    backend = os.getenv("CONTEXT_CACHE_BACKEND", "gemini").lower()
+    if backend == "none":
+        return None
+    if backend == "fake":
+        return FakeContextCache()
+    try:
+        return GeminiContextCache()
+    except Exception as e:
+        logger.warning(f"Gemini context caching disabled: {e}")
+        return None
+
+
+_prefix_cache: PromptPrefixCache | None = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> PromptPrefixCache:
+    global _prefix_cache
+    with _prefix_cache_lock:
+        if _prefix_cache is None:
+            _prefix_cache = PromptPrefixCache(backend=create_context_cache_backend())
+    return _prefix_cache
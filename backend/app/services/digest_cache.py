@@ -0,0 +1,78 @@
+import os
+import re
+import time
+import logging
+
+from app.services.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "digests"
+
+# Phrases users type when they just want "the usual" digest again.
+REPEAT_PHRASES = ("run it again", "do it again", "the usual", "same as before", "same as yesterday", "my usual")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, strips punctuation and collapses whitespace so near-identical queries share a key."""
+    query = re.sub(r"[^\w\s]", " ", (query or "").lower())
+    return " ".join(query.split())
+
+
+def extract_days(query: str, default: int = 14) -> int:
+    """Best-effort lookback window from the message ("last 3 days", "this week", "today")."""
+    normalized = normalize_query(query)
+    match = re.search(r"(?:last|past)\s+(\d+)\s+(day|week)", normalized)
+    if match:
+        return int(match.group(1)) * (7 if match.group(2) == "week" else 1)
+    if "today" in normalized or "yesterday" in normalized:
+        return 1
+    if "week" in normalized:
+        return 7
+    return default
+
+
+class DigestCache:
+    """
+    Stores finished digests (text + audio file) keyed by user and normalized query,
+    so a pre-computed morning digest can be served without re-running the pipeline.
+    Entries live in the shared SQLite store, so a digest precomputed by one worker is
+    served by all of them.
+    """
+
+    def __init__(self, ttl_seconds: int = None, store=None):
+        self.ttl_seconds = ttl_seconds or int(os.getenv("DIGEST_CACHE_TTL_SECONDS", str(20 * 3600)))
+        self.store = store or get_shared_store()
+
+    @staticmethod
+    def _key(user_id: str, query: str) -> str:
+        return f"{user_id}:{normalize_query(query)}"
+
+    def get(self, user_id: str, query: str) -> dict | None:
+        try:
+            entry = self.store.get(NAMESPACE, self._key(user_id, query))
+        except Exception as e:
+            logger.error(f"Failed to load digest cache: {e}")
+            return None
+        if not entry or time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            return None
+        return entry
+
+    def put(self, user_id: str, query: str, digest: str, audio_file: str | None, stats: dict | None = None):
+        entry = {
+            "query": query,
+            "digest": digest,
+            "audio_file": audio_file,
+            "created_at": time.time(),
+            "stats": stats or {},
+        }
+        try:
+            self.store.set(NAMESPACE, self._key(user_id, query), entry, ttl_seconds=self.ttl_seconds)
+            self.store.purge_expired()
+        except Exception as e:
+            logger.error(f"Failed to save digest cache: {e}")
+
+    @staticmethod
+    def is_repeat_request(user_input: str) -> bool:
+        normalized = normalize_query(user_input)
+        return any(phrase in normalized for phrase in REPEAT_PHRASES)
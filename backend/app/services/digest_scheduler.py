@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+
+from app.services.shared_store import get_shared_store
+from app.services.user_context_service import UserContextService
+
+logger = logging.getLogger(__name__)
+
+RUNS_NAMESPACE = "digest_runs"
+
+
+class DigestScheduler:
+    """
+    In-process scheduler that pre-computes each user's daily digest at a set time,
+    so the morning "run it again" request is a digest cache hit.
+
+    Every uvicorn worker runs one; leases in the shared store make sure only one of them
+    executes each daily slot (and each manual run), and run history is shared.
+
+    Configuration (env):
+        DIGEST_SCHEDULE_TIME: local time of day to run, "HH:MM" (default "06:30").
+        DIGEST_SCHEDULE_QUERIES: ";"-separated queries to always pre-compute (optional).
+        DIGEST_SCHEDULE_CONCURRENCY: max digests built at once (default 2).
+        DIGEST_SCHEDULE_JITTER_SECONDS: random start delay per job (default 300).
+    """
+
+    def __init__(self, agent_factory, context_service: UserContextService = None, store=None):
+        self.agent_factory = agent_factory
+        self.context_service = context_service or UserContextService()
+        self.store = store or get_shared_store()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.run_lease_seconds = float(os.getenv("DIGEST_RUN_LEASE_SECONDS", "3600"))
+        self.schedule_time = os.getenv("DIGEST_SCHEDULE_TIME", "06:30")
+        self.configured_queries = [q.strip() for q in os.getenv("DIGEST_SCHEDULE_QUERIES", "").split(";") if q.strip()]
+        self.concurrency = int(os.getenv("DIGEST_SCHEDULE_CONCURRENCY", "2"))
+        self.jitter_seconds = float(os.getenv("DIGEST_SCHEDULE_JITTER_SECONDS", "300"))
+        self.max_history = 20
+        self._task = None
+        self._manual_task = None
+        self._running_lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Digest scheduler started (daily at {self.schedule_time})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def trigger(self):
+        """Starts a manual run in the background (keeps a reference so it isn't garbage collected)."""
+        self._manual_task = asyncio.create_task(self.run_once(trigger="manual"))
+        return self._manual_task
+
+    def _seconds_until_next_run(self, now: datetime = None) -> float:
+        now = now or datetime.now()
+        hour, minute = (int(part) for part in self.schedule_time.split(":"))
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    async def _loop(self):
+        while True:
+            delay = self._seconds_until_next_run()
+            logger.info(f"Next scheduled digest run in {delay / 3600:.1f}h")
+            await asyncio.sleep(delay)
+            # The first worker to wake up claims today's slot; the others skip it.
+            slot = f"digest_schedule:{datetime.now().date().isoformat()}"
+            if not self.store.acquire_lease(slot, self.owner, ttl_seconds=20 * 3600):
+                logger.info(f"Scheduled digest run {slot} already claimed by another worker.")
+                await asyncio.sleep(60)
+                continue
+            try:
+                await self.run_once(trigger="schedule")
+            except Exception as e:
+                logger.error(f"Scheduled digest run failed: {e}")
+
+    def _collect_jobs(self) -> list[tuple[str, str]]:
+        """Returns (user_id, query) pairs to pre-compute."""
+        # Single-user app for now: the context file holds the one user's last query.
+        queries = list(self.configured_queries)
+        last_labels = self.context_service.get_last_labels()
+        if last_labels:
+            queries.append(" ".join(last_labels))
+        # Preserve order, drop duplicates
+        return [("user", q) for q in dict.fromkeys(queries)]
+
+    async def run_once(self, trigger: str = "manual", jitter: bool = None) -> dict:
+        """
+        Pre-computes all jobs with jittered, bounded concurrency and records timing stats.
+        """
+        if jitter is None:
+            jitter = trigger == "schedule"
+
+        if self._running_lock.locked() or not self.store.acquire_lease("digest_run", self.owner, self.run_lease_seconds):
+            logger.info("Digest run already in progress, skipping.")
+            return {"status": "already_running"}
+
+        async with self._running_lock:
+            try:
+                return await self._run(trigger, jitter)
+            finally:
+                self.store.release_lease("digest_run", self.owner)
+
+    async def _run(self, trigger: str, jitter: bool) -> dict:
+        jobs = self._collect_jobs()
+        run = {
+            "trigger": trigger,
+            "started_at": datetime.now().isoformat(),
+            "jobs": [],
+        }
+        if not jobs:
+            logger.info("No digest queries to pre-compute.")
+
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def run_job(user_id: str, query: str):
+            if jitter and self.jitter_seconds > 0:
+                await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+            async with semaphore:
+                job_started = time.perf_counter()
+                result = {"user_id": user_id, "query": query}
+                try:
+                    # The factory builds the agent (ADK imports) on first use; keep that off the event loop
+                    agent = await asyncio.to_thread(self.agent_factory)
+                    result.update(await agent.precompute_digest(query, user_id=user_id))
+                    result["status"] = "success"
+                except Exception as e:
+                    logger.error(f"Failed to pre-compute digest for '{query}': {e}")
+                    result["status"] = "error"
+                    result["error"] = str(e)
+                result["wall_seconds"] = round(time.perf_counter() - job_started, 3)
+                run["jobs"].append(result)
+
+        await asyncio.gather(*(run_job(user_id, query) for user_id, query in jobs))
+
+        run["total_seconds"] = round(time.perf_counter() - started, 3)
+        run["succeeded"] = sum(1 for j in run["jobs"] if j["status"] == "success")
+        run["failed"] = len(run["jobs"]) - run["succeeded"]
+        self.store.update(RUNS_NAMESPACE, "history", lambda history: ((history or []) + [run])[-self.max_history:])
+        logger.info(f"Digest run ({trigger}) finished: {run['succeeded']} ok, {run['failed']} failed in {run['total_seconds']}s")
+        return run
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running_lock.locked(),
+            "schedule_time": self.schedule_time,
+            "next_run_in_seconds": round(self._seconds_until_next_run()) if self._task else None,
+            "running_elsewhere": self.store.get("leases", "digest_run") not in (None, self.owner),
+            "runs": self.run_history,
+        }
+
+    @property
+    def run_history(self) -> list[dict]:
+        """Recent runs from every worker (shared store)."""
+        return self.store.get(RUNS_NAMESPACE, "history", [])
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+from app.services.cancellation import CancellationToken, OperationCancelled
+from app.services.shared_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "email_ingest"
+LEASE = "email_ingest"
+# Mail that shouldn't be searchable in digests
+SKIP_LABELS = {"SPAM", "TRASH", "DRAFT"}
+
+
+class EmailIngestor:
+    """
+    Background job that fills the persistent email index with the mailbox itself, not just the
+    candidates a query happened to fetch:
+
+    - backfill: pages through EMAIL_BACKFILL_DAYS of history, newest first. Each step handles one
+      Gmail page: metadata fetches plus embedding batches, all under the rate governor. The page
+      cursor is kept in the shared store, so a restart resumes where it stopped.
+    - incremental sync: every EMAIL_SYNC_INTERVAL_SECONDS, applies the Gmail history since the
+      last sync (new mail indexed, deleted mail dropped). If Gmail no longer has that history, it
+      re-lists mail received since the last sync instead.
+
+    Every uvicorn worker runs one; a lease in the shared store makes sure only one of them ingests.
+
+    Configuration (env):
+        ENABLE_EMAIL_INGESTION: "false" (default) / "true". Opt-in: it spends Gmail and embedding quota
+            and stores mail metadata on disk.
+        EMAIL_BACKFILL_DAYS: how far back to index (default 180).
+        EMAIL_BACKFILL_PAGE_SIZE: messages per backfill step (default 100).
+        EMAIL_BACKFILL_PAUSE_SECONDS: pause between backfill steps, leaves quota for requests (default 5).
+        EMAIL_SYNC_INTERVAL_SECONDS: incremental sync period, and retry delay when not ready (default 300).
+    """
+
+    def __init__(self, user_id: str = "user", aggregator_factory=None, store=None):
+        self.user_id = user_id
+        self.aggregator_factory = aggregator_factory
+        self.store = store or get_shared_store()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.backfill_days = int(os.getenv("EMAIL_BACKFILL_DAYS", "180"))
+        self.page_size = int(os.getenv("EMAIL_BACKFILL_PAGE_SIZE", "100"))
+        self.pause_seconds = float(os.getenv("EMAIL_BACKFILL_PAUSE_SECONDS", "5"))
+        self.sync_interval = float(os.getenv("EMAIL_SYNC_INTERVAL_SECONDS", "300"))
+        self.lease_seconds = max(600.0, 2 * self.sync_interval)
+        self.aggregator = None
+        self.last_error = None
+        self._task = None
+        self._cancel_token = CancellationToken()
+
+    def start(self):
+        if self._task is None:
+            self._cancel_token = CancellationToken()
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Email ingestion started (backfill {self.backfill_days} days)")
+
+    async def stop(self):
+        if self._task:
+            # Stops the page being processed in its thread at the next Gmail call / embedding batch
+            self._cancel_token.cancel()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.store.release_lease(LEASE, self.owner)
+
+    async def _loop(self):
+        while True:
+            delay = self.sync_interval
+            try:
+                delay = await asyncio.to_thread(self.run_step)
+                self.last_error = None
+            except OperationCancelled:
+                return
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Email ingestion step failed: {e}")
+            await asyncio.sleep(delay)
+
+    # --- Steps (run in a worker thread) ---
+
+    def _state(self) -> dict:
+        return self.store.get(NAMESPACE, self.user_id) or {}
+
+    def _save_state(self, state: dict):
+        self.store.set(NAMESPACE, self.user_id, state)
+
+    def _ready(self) -> bool:
+        if self.aggregator is None:
+            if self.aggregator_factory:
+                self.aggregator = self.aggregator_factory()
+            else:
+                from app.agents.email_aggregator import EmailAggregator
+                self.aggregator = EmailAggregator(user_id=self.user_id)
+        return bool(self.aggregator.service) and self.aggregator._embeddings_ready()
+
+    def run_step(self) -> float:
+        """Runs one backfill page or one incremental sync. Returns seconds until the next step."""
+        if not self.store.acquire_lease(LEASE, self.owner, self.lease_seconds):
+            return self.sync_interval
+        if not self._ready():
+            logger.info("Email ingestion waiting for Gmail credentials and an embedding API key")
+            return self.sync_interval
+
+        state = self._state()
+        if not state.get("backfill_done"):
+            self._backfill_page(state)
+            self._save_state(state)
+            return self.pause_seconds if not state.get("backfill_done") else self.sync_interval
+
+        if time.time() - state.get("last_sync", 0) >= self.sync_interval:
+            self._sync(state)
+            self._save_state(state)
+        return self.sync_interval
+
+    def _users(self):
+        return self.aggregator.service.users()
+
+    def _history_id(self) -> str:
+        return self.aggregator._execute(self._users().getProfile(userId='me'))["historyId"]
+
+    def _index_ids(self, message_ids: list[str]) -> int:
+        """Fetches metadata for ids the index doesn't have yet and embeds them. Returns how many were new."""
+        agg = self.aggregator
+        new_ids = [msg_id for msg_id in dict.fromkeys(message_ids) if msg_id not in agg.vector_index]
+        emails = [agg._get_email(msg_id, self._cancel_token) for msg_id in new_ids]
+        agg._index_embeddings(emails, self._cancel_token)
+        return len(emails)
+
+    def _backfill_page(self, state: dict):
+        if "backfill_query" not in state:
+            # Mail arriving while the backfill runs is picked up by the first incremental sync
+            start = datetime.now() - timedelta(days=self.backfill_days)
+            state.update({
+                "backfill_query": f"after:{start.strftime('%Y/%m/%d')} -in:spam -in:trash",
+                "history_id": self._history_id(),
+                "backfilled": 0,
+                "last_sync": time.time(),
+            })
+        results = self.aggregator._execute(self._users().messages().list(
+            userId='me', q=state["backfill_query"], maxResults=self.page_size, pageToken=state.get("backfill_token")
+        ))
+        added = self._index_ids([m['id'] for m in results.get('messages', [])])
+        state["backfilled"] += added
+        state["backfill_token"] = results.get('nextPageToken')
+        if not state["backfill_token"]:
+            state["backfill_done"] = True
+            logger.info(f"Email backfill finished: {state['backfilled']} emails indexed")
+        elif added:
+            logger.info(f"Email backfill: {state['backfilled']} emails indexed so far")
+
+    def _sync(self, state: dict):
+        from googleapiclient.errors import HttpError
+
+        added, deleted = [], []
+        history_id = state.get("history_id")
+        page_token = None
+        try:
+            while history_id:
+                results = self.aggregator._execute(self._users().history().list(
+                    userId='me', startHistoryId=history_id, historyTypes=['messageAdded', 'messageDeleted'], pageToken=page_token
+                ))
+                for record in results.get('history', []):
+                    added += [m['message']['id'] for m in record.get('messagesAdded', [])
+                              if not SKIP_LABELS & set(m['message'].get('labelIds', []))]
+                    deleted += [m['message']['id'] for m in record.get('messagesDeleted', [])]
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    history_id = results.get('historyId', history_id)
+                    break
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            history_id = None
+        if not history_id:
+            # Gmail only keeps about a week of history: re-list mail since the last sync instead
+            since = datetime.fromtimestamp(state.get("last_sync", time.time())) - timedelta(days=1)
+            history_id = self._history_id()
+            for message_ids in self.aggregator._list_message_ids(f"after:{since.strftime('%Y/%m/%d')} -in:spam -in:trash", self._cancel_token):
+                added += message_ids
+
+        agg = self.aggregator
+        removed = agg.vector_index.remove(deleted) if deleted else 0
+        for doc_id in deleted:
+            agg.lexical_index.remove(doc_id)
+        deleted_ids = set(deleted)
+        new = self._index_ids([msg_id for msg_id in added if msg_id not in deleted_ids])
+        state.update({"history_id": history_id, "last_sync": time.time()})
+        state["synced_added"] = state.get("synced_added", 0) + new
+        state["synced_removed"] = state.get("synced_removed", 0) + removed
+        if new or removed:
+            logger.info(f"Email sync: {new} indexed, {removed} removed")
+
+    def stats(self) -> dict:
+        state = self._state()
+        return {
+            "running": self._task is not None,
+            "ingesting_elsewhere": self.store.get("leases", LEASE) not in (None, self.owner),
+            "backfill_days": self.backfill_days,
+            "backfill_done": bool(state.get("backfill_done")),
+            "backfilled": state.get("backfilled", 0),
+            "synced_added": state.get("synced_added", 0),
+            "synced_removed": state.get("synced_removed", 0),
+            "last_sync": datetime.fromtimestamp(state["last_sync"]).isoformat() if state.get("last_sync") else None,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,119 @@
+import asyncio
+import mimetypes
+import os
+import re
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    """A well-formed byte range that lies outside the file (answered with 416)."""
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single "bytes=start-end" range. Returns inclusive (start, end), or None if the header
+    should be ignored and the full file served (RFC 9110): other units, malformed ranges, and
+    multi-range requests, which are not supported. Raises RangeNotSatisfiable if it lies outside the file.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+    if not start_str:
+        # Suffix range: last N bytes
+        length = int(end_str)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(start_str)
+    end = int(end_str) if end_str else None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+async def _iter_file(path: str, start: int, length: int):
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def ranged_file_response(request: Request, path: str, filename: str, retention_seconds: int = 0, media_type: str = None):
+    """
+    Serves a file with HTTP Range, ETag and conditional GET support,
+    so audio players can seek without re-downloading the whole digest.
+    Clients may cache the file until it is due to be reaped (`retention_seconds` after mtime).
+    """
+    try:
+        st = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+
+    size = st.st_size
+    etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    max_age = int(retention_seconds - (time.time() - st.st_mtime))
+    media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"private, max-age={max(max_age, 0)}",
+        "Content-Disposition": f"attachment; filename={filename}",
+    }
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range validator means the client must get the full (new) file.
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(_iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    if request.method == "HEAD":
+        return Response(status_code=200, media_type=media_type, headers=headers)
+    return StreamingResponse(_iter_file(path, 0, size), status_code=200, media_type=media_type, headers=headers)
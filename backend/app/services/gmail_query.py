@@ -0,0 +1,74 @@
+import re
+from datetime import datetime, timedelta
+
+from app.services.lexical_index import STOPWORDS, tokenize
+
+# Words in a request that name a Gmail category tab ("updates" is too common in "project updates").
+CATEGORY_WORDS = {
+    "promotions": "promotions", "promotion": "promotions", "promo": "promotions", "deals": "promotions",
+    "social": "social",
+    "forums": "forums", "forum": "forums",
+}
+# Request phrasing and time words that would only narrow a Gmail search ("from yesterday" is not a sender).
+NOISE_WORDS = {
+    "yesterday", "tonight", "this", "that", "past", "weeks", "month", "months", "hours", "recent", "latest",
+    "new", "inbox", "email", "emails", "mail", "newsletter", "newsletters", "all", "any", "anything",
+    "everyone", "anyone", "i", "you", "your", "us", "please", "tell", "show", "get", "read", "can",
+    "do", "did", "happened", "happening", "going", "again", "usual", "run", "by", "grouped", "sorted", "topic", "topics",
+}
+# Only "from X" names a sender; "by" is mostly phrasing ("grouped by topic").
+SENDER_RE = re.compile(r"\bfrom\s+(?:the\s+)?([\w.@+-]+)", re.IGNORECASE)
+
+
+def derive_filters(query: str) -> dict:
+    """
+    Splits a request into Gmail-searchable parts:
+    {"keywords": [...], "senders": [...], "categories": [...]}.
+    "AI news from The Verge" -> keywords ["ai"], senders ["verge"].
+    """
+    senders = [s.lower() for s in SENDER_RE.findall(query or "") if s.lower() not in STOPWORDS | NOISE_WORDS]
+    sender_terms = set(tokenize(" ".join(senders), drop_stopwords=False))
+    categories, keywords = [], []
+    for token in tokenize(query):
+        if token in CATEGORY_WORDS:
+            categories.append(CATEGORY_WORDS[token])
+        elif token not in sender_terms and token not in NOISE_WORDS and not token.isdigit():
+            keywords.append(token)
+    return {
+        "keywords": list(dict.fromkeys(keywords)),
+        "senders": list(dict.fromkeys(senders)),
+        "categories": list(dict.fromkeys(categories)),
+    }
+
+
+def build_gmail_queries(query: str, days: int, exclude_categories: list[str] = None, now: datetime = None) -> list[str]:
+    """
+    Gmail `q` strings to page through, most selective first: keywords OR-ed (`{a b}`) plus sender,
+    category and date filters, then sender/category and date without keywords, then only the
+    configured category exclusions (e.g. promotions, social; skipped if the request asks for that
+    category) and the date. The last pass is the date alone, so semantically related mail that
+    doesn't share a word with the request, was misread as a sender or sits in an excluded tab
+    (newsletters often land in Promotions) is still reachable.
+    """
+    filters = derive_filters(query)
+    derived = []
+    if filters["senders"]:
+        derived.append("{" + " ".join(f"from:{s}" for s in filters["senders"]) + "}")
+    if filters["categories"]:
+        derived.append("{" + " ".join(f"category:{c}" for c in filters["categories"]) + "}")
+    exclusions = [f"-category:{c}" for c in (exclude_categories or []) if c not in filters["categories"]]
+    date = []
+    if days:
+        cutoff = (now or datetime.now()) - timedelta(days=days)
+        date.append(f"after:{cutoff.strftime('%Y/%m/%d')}")
+
+    queries = []
+    if filters["keywords"]:
+        queries.append(" ".join(["{" + " ".join(filters["keywords"]) + "}"] + derived + exclusions + date))
+    if derived:
+        queries.append(" ".join(derived + exclusions + date))
+    if exclusions:
+        queries.append(" ".join(exclusions + date))
+    # Last pass: nothing derived from the request and nothing excluded
+    queries.append(" ".join(date))
+    return queries
@@ -0,0 +1,134 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "for", "from", "in", "is", "it", "me", "my", "of", "on",
+    "or", "the", "to", "what", "whats", "with", "s", "news", "updates", "update", "last", "days",
+    "day", "week", "today", "summarize", "summary", "digest", "podcast", "make", "create", "give",
+}
+
+# Subject and sender carry more signal than snippet text.
+FIELD_WEIGHTS = {"subject": 2, "sender": 2, "body": 1}
+
+
+def tokenize(text: str, drop_stopwords: bool = True) -> list[str]:
+    tokens = TOKEN_RE.findall((text or "").lower())
+    if drop_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS]
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Fuses several ranked id lists; ids missing from a list just get no score from it."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """
+    Small in-memory inverted index (BM25) over email subjects, senders and snippets.
+    Kept in sync by EmailAggregator as mail is fetched; oldest documents are evicted past `max_docs`.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_docs: int = 20000):
+        self.k1 = k1
+        self.b = b
+        self.max_docs = max_docs
+        self._docs: "OrderedDict[str, Counter]" = OrderedDict()
+        self._lengths: dict[str, int] = {}
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def add(self, doc_id: str, fields: dict[str, str]):
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field, "")):
+                terms[token] += weight
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove_locked(doc_id)
+            self._docs[doc_id] = terms
+            length = sum(terms.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            for token in terms:
+                self._postings[token].add(doc_id)
+            while len(self._docs) > self.max_docs:
+                self._remove_locked(next(iter(self._docs)))
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str):
+        terms = self._docs.pop(doc_id)
+        self._total_length -= self._lengths.pop(doc_id, 0)
+        for token in terms:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[token]
+
+    def search(self, query: str, candidate_ids: list[str] = None, top_k: int = None) -> list[tuple[str, float]]:
+        """Returns (doc_id, score) for documents matching at least one query term, best first."""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+        allowed = set(candidate_ids) if candidate_ids is not None else None
+        scores = defaultdict(float)
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_len = self._total_length / n_docs
+            for term in query_terms:
+                postings = self._postings.get(term, ())
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id in postings:
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    tf = self._docs[doc_id][term]
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+    def full_matches(self, query: str, doc_ids: list[str]) -> list[str]:
+        """The `doc_ids` that contain every (non-stopword) query term."""
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+        with self._lock:
+            return [doc_id for doc_id in doc_ids if doc_id in self._docs and query_terms <= self._docs[doc_id].keys()]
+
+    def full_match_count(self, query: str, doc_ids: list[str]) -> int:
+        """How many of `doc_ids` contain every (non-stopword) query term."""
+        return len(self.full_matches(query, doc_ids))
+
+
+_index: BM25Index | None = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> BM25Index:
+    """Process-wide index, shared by every EmailAggregator."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = BM25Index()
+    return _index
@@ -0,0 +1,152 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# Candidate models per pipeline stage, preferred first. Override with MODEL_<STAGE>="model-a,model-b".
+# Tool-argument extraction and critique run on the lighter model; the final writing stays on flash.
+DEFAULT_STAGE_MODELS = {
+    "aggregator": ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+    "drafter": ["gemini-2.5-flash", "gemini-2.5-flash-lite"],
+    "critic": ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+}
+
+# Per-request record of the model each stage actually used (read back by ConciergeAgent).
+_stage_models: contextvars.ContextVar[dict | None] = contextvars.ContextVar("stage_models", default=None)
+
+
+def start_stage_recording() -> dict:
+    """Starts recording stage -> model choices for the current request; returns the (live) dict."""
+    record = {}
+    _stage_models.set(record)
+    return record
+
+
+class ModelRouter:
+    """
+    Picks a model per stage (aggregator / drafter / critic) from an ordered candidate list.
+
+    Every LLM call reports its latency and outcome. The first candidate whose recent p95 latency
+    and error rate are within the stage's thresholds wins; when all are unhealthy, the one with
+    the lowest error rate (then p95) is used. Observations age out of the window, so a model
+    that was skipped is retried once its bad samples expire.
+
+    Configuration (env):
+        MODEL_<STAGE>: comma-separated candidates, e.g. MODEL_CRITIC="gemini-2.5-flash-lite,gemini-2.5-flash".
+        MODEL_ROUTER_P95_SECONDS[_<STAGE>]: p95 latency threshold (default 20, aggregator 10).
+        MODEL_ROUTER_MAX_ERROR_RATE: error-rate threshold (default 0.2).
+        MODEL_ROUTER_WINDOW_SECONDS: observation window (default 600).
+        MODEL_ROUTER_MIN_SAMPLES: samples needed before a model can be judged (default 5).
+    """
+
+    def __init__(self, stage_models: dict[str, list[str]] = None, window_seconds: float = None, min_samples: int = None, max_error_rate: float = None):
+        self.stage_models = {stage: self._candidates_for(stage, default) for stage, default in DEFAULT_STAGE_MODELS.items()}
+        self.stage_models.update(stage_models or {})
+        self.window_seconds = window_seconds or float(os.getenv("MODEL_ROUTER_WINDOW_SECONDS", "600"))
+        self.min_samples = min_samples or int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "5"))
+        self.max_error_rate = max_error_rate if max_error_rate is not None else float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.2"))
+        self.p95_thresholds = {
+            stage: float(os.getenv(f"MODEL_ROUTER_P95_SECONDS_{stage.upper()}", os.getenv("MODEL_ROUTER_P95_SECONDS", "10" if stage == "aggregator" else "20")))
+            for stage in self.stage_models
+        }
+        # (stage, model) -> deque of (timestamp, latency_seconds, failed)
+        self._samples: dict[tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=200))
+        self._choices = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _candidates_for(stage: str, default: list[str]) -> list[str]:
+        env = os.getenv(f"MODEL_{stage.upper()}")
+        if env:
+            return [m.strip() for m in env.split(",") if m.strip()]
+        return list(default)
+
+    def primary(self, stage: str) -> str:
+        return self.stage_models[stage][0]
+
+    def _health(self, stage: str, model: str, now: float) -> dict:
+        samples = self._samples.get((stage, model))
+        while samples and now - samples[0][0] > self.window_seconds:
+            samples.popleft()
+        if not samples:
+            return {"samples": 0, "p95_seconds": 0.0, "error_rate": 0.0}
+        latencies = sorted(latency for _, latency, failed in samples if not failed)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+        return {
+            "samples": len(samples),
+            "p95_seconds": round(p95, 3),
+            "error_rate": round(sum(1 for _, _, failed in samples if failed) / len(samples), 3),
+        }
+
+    def _healthy(self, stage: str, health: dict) -> bool:
+        if health["samples"] < self.min_samples:
+            return True
+        return health["p95_seconds"] <= self.p95_thresholds[stage] and health["error_rate"] <= self.max_error_rate
+
+    def choose(self, stage: str, candidates: list[str] = None) -> str:
+        """Picks the model for one call; `candidates` overrides the stage's configured list for this call only."""
+        candidates = candidates or self.stage_models[stage]
+        now = time.monotonic()
+        with self._lock:
+            health = {model: self._health(stage, model, now) for model in candidates}
+            chosen = next((m for m in candidates if self._healthy(stage, health[m])), None)
+            if chosen is None:
+                chosen = min(candidates, key=lambda m: (health[m]["error_rate"], health[m]["p95_seconds"]))
+            if chosen != candidates[0]:
+                logger.info(f"Routing {stage} to fallback model {chosen} (primary {candidates[0]}: {health[candidates[0]]})")
+            self._choices[stage][chosen] += 1
+        return chosen
+
+    def record(self, stage: str, model: str, latency: float, failed: bool = False):
+        with self._lock:
+            self._samples[(stage, model)].append((time.monotonic(), latency, failed))
+
+    def callback(self, stage: str, candidates: list[str] = None):
+        """
+        before_model_callback that sets the model for this call. Must run before the prompt-prefix
+        cache callback, since cached content is tied to a model. `candidates` lets one pipeline use
+        its own list without changing the router's (shared) configuration.
+        """
+        from opentelemetry import trace
+
+        async def before_model(callback_context, llm_request):
+            model = self.choose(stage, candidates)
+            llm_request.model = model
+            record = _stage_models.get()
+            if record is not None:
+                record[stage] = model
+            span = trace.get_current_span()
+            span.set_attribute("albert.stage", stage)
+            span.set_attribute("albert.model", model)
+            return None
+
+        return before_model
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                stage: {
+                    "candidates": candidates,
+                    "p95_threshold_seconds": self.p95_thresholds[stage],
+                    "choices": dict(self._choices[stage]),
+                    "health": {model: self._health(stage, model, now) for model in candidates},
+                }
+                for stage, candidates in self.stage_models.items()
+            }
+
+
+_router: ModelRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+    return _router
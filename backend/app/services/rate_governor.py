@@ -0,0 +1,307 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Default client-side budgets per API: (requests/sec, burst). Override with RATE_LIMIT_<API>="rate:burst".
+# Gmail: 250 quota units/user/sec, messages.get costs 5 units.
+DEFAULT_LIMITS = {
+    "gmail": (40.0, 40),
+    "gemini": (10.0, 10),   # embeddings
+    "llm": (2.0, 4),        # ADK LlmAgent model calls
+    "tts": (1.0, 2),
+}
+DEFAULT_PER_USER_LIMIT = (20.0, 20)
+RETRYABLE_STATUS = {429, 500, 503}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be admitted or retried before its deadline."""
+
+
+def _status_code(exc: Exception) -> int | None:
+    # googleapiclient.errors.HttpError
+    resp = getattr(exc, "resp", None)
+    if resp is not None and getattr(resp, "status", None):
+        return int(resp.status)
+    # google.api_core exceptions / google.genai errors
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status in RETRYABLE_STATUS:
+        return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "Quota exceeded" in text
+
+
+def is_throttle(exc: Exception) -> bool:
+    status = _status_code(exc)
+    return status == 429 or "429" in str(exc) or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `reserve()` books a token and returns how long to wait for it."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = None) -> float | None:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: grows by ~1 per window of successful calls, halves on a 429
+    or when latency exceeds `latency_target` seconds.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, latency_target: float = None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout: float = None) -> bool:
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self.try_acquire():
+            if end is not None and time.monotonic() >= end:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def release(self, latency: float = None, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled or (latency is not None and self.latency_target and latency > self.latency_target):
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class RateGovernor:
+    """
+    Client-side rate governor shared by Gmail, Gemini (embeddings + LLM) and TTS calls.
+
+    Each call passes through a per-API token bucket, an optional per-user bucket and an
+    AIMD concurrency limiter, then is retried with full-jitter exponential backoff on
+    429/5xx responses until its deadline. Bursts are smoothed instead of failing outright.
+    """
+
+    def __init__(self, limits: dict = None, base_delay: float = 0.5, max_delay: float = 20.0, max_attempts: int = 5, default_timeout: float = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.default_timeout = default_timeout or float(os.getenv("RATE_GOVERNOR_TIMEOUT_SECONDS", "120"))
+        # Budgets are per process; split them across uvicorn workers so N workers don't send N x the quota.
+        self.workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        self._buckets: dict = {}
+        self._limiters: dict = {}
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: defaultdict(float))
+
+    def _limit_for(self, api: str) -> tuple[float, int]:
+        env = os.getenv(f"RATE_LIMIT_{api.upper()}")
+        if env:
+            rate, _, burst = env.partition(":")
+            return float(rate), int(burst or max(1, float(rate)))
+        return self.limits.get(api, (5.0, 5))
+
+    def _bucket(self, api: str, user_id: str = None) -> TokenBucket:
+        key = (api, user_id)
+        with self._lock:
+            if key not in self._buckets:
+                rate, burst = self._limit_for(api) if user_id is None else DEFAULT_PER_USER_LIMIT
+                self._buckets[key] = TokenBucket(rate / self.workers, max(1, round(burst / self.workers)))
+            return self._buckets[key]
+
+    def _limiter(self, api: str) -> AdaptiveConcurrencyLimiter:
+        with self._lock:
+            if api not in self._limiters:
+                latency_target = float(os.getenv(f"RATE_LATENCY_TARGET_{api.upper()}", "0")) or None
+                self._limiters[api] = AdaptiveConcurrencyLimiter(latency_target=latency_target)
+            return self._limiters[api]
+
+    def _record(self, api: str, key: str, value: float = 1):
+        with self._lock:
+            self._metrics[api][key] += value
+
+    def _admission_wait(self, api: str, user_id: str, deadline: float) -> float:
+        """Reserves tokens from the API (and user) buckets; returns the total wait."""
+        wait = 0.0
+        for bucket in [self._bucket(api)] + ([self._bucket(api, user_id)] if user_id else []):
+            reserved = bucket.reserve(max_wait=deadline - time.monotonic())
+            if reserved is None:
+                self._record(api, "rejected")
+                raise RateLimitExceeded(f"{api}: no capacity before deadline")
+            wait = max(wait, reserved)
+        if wait > 0:
+            self._record(api, "throttled")
+            self._record(api, "throttle_wait_seconds", wait)
+        return wait
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _should_retry(self, api: str, exc: Exception, attempt: int, deadline: float) -> float | None:
+        """Returns the backoff delay if the call should be retried, else None."""
+        if not is_retryable(exc) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self._record(api, "retried")
+        logger.warning(f"[{api}] retryable error ({exc}); retrying in {delay:.2f}s (attempt {attempt + 2}/{self.max_attempts})")
+        return delay
+
+    def call(self, api: str, fn, *args, user_id: str = None, timeout: float = None, **kwargs):
+        """Runs a blocking call under the governor (for Gmail/embedding/TTS calls made in threads)."""
+        deadline = time.monotonic() + (timeout or self.default_timeout)
+        limiter = self._limiter(api)
+        attempt = 0
+        while True:
+            time.sleep(self._admission_wait(api, user_id, deadline))
+            if not limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                self._record(api, "rejected")
+                raise RateLimitExceeded(f"{api}: concurrency limit not available before deadline")
+            started = time.monotonic()
+            self._record(api, "calls")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle(e)
+                limiter.release(throttled=throttled)
+                if throttled:
+                    self._record(api, "server_throttled")
+                delay = self._should_retry(api, e, attempt, deadline)
+                if delay is None:
+                    self._record(api, "failed")
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            latency = time.monotonic() - started
+            limiter.release(latency=latency)
+            self._record(api, "latency_seconds_total", latency)
+            return result
+
+    async def acall(self, api: str, coro_fn, *args, user_id: str = None, timeout: float = None, **kwargs):
+        """Async variant of `call` for coroutine functions."""
+        results = [item async for item in self.astream(api, lambda: _single(coro_fn, *args, **kwargs), user_id=user_id, timeout=timeout)]
+        return results[0]
+
+    async def astream(self, api: str, gen_factory, user_id: str = None, timeout: float = None):
+        """
+        Runs an async generator under the governor. Retries only happen before the first
+        item is yielded, so partial streams are never replayed.
+        """
+        deadline = time.monotonic() + (timeout or self.default_timeout)
+        limiter = self._limiter(api)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._admission_wait(api, user_id, deadline))
+            if not await limiter.acquire_async(timeout=max(0.0, deadline - time.monotonic())):
+                self._record(api, "rejected")
+                raise RateLimitExceeded(f"{api}: concurrency limit not available before deadline")
+            started = time.monotonic()
+            self._record(api, "calls")
+            yielded = False
+            try:
+                async for item in gen_factory():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                throttled = is_throttle(e)
+                limiter.release(throttled=throttled)
+                if throttled:
+                    self._record(api, "server_throttled")
+                delay = None if yielded else self._should_retry(api, e, attempt, deadline)
+                if delay is None:
+                    self._record(api, "failed")
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancellation / generator close: free the slot without adjusting the limit.
+                limiter.release()
+                raise
+            latency = time.monotonic() - started
+            limiter.release(latency=latency)
+            self._record(api, "latency_seconds_total", latency)
+            return
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = {api: dict(values) for api, values in self._metrics.items()}
+            limiters = dict(self._limiters)
+        snapshot = {}
+        for api, values in metrics.items():
+            limiter = limiters.get(api)
+            snapshot[api] = {k: round(v, 3) for k, v in values.items()}
+            if limiter:
+                snapshot[api]["concurrency_limit"] = round(limiter.limit, 2)
+                snapshot[api]["in_flight"] = limiter.in_flight
+        return snapshot
+
+
+async def _single(coro_fn, *args, **kwargs):
+    yield await coro_fn(*args, **kwargs)
+
+
+_governor: RateGovernor | None = None
+_governor_lock = threading.Lock()
+
+
+def get_rate_governor() -> RateGovernor:
+    """Process-wide governor, so all integrations share the same budgets."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = RateGovernor()
+    return _governor
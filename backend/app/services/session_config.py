@@ -0,0 +1,43 @@
+import os
+from importlib.util import find_spec
+
+# Kept free of ADK imports so main can validate the session backend at startup cheaply.
+
+DEFAULT_MULTI_WORKER_DB_URL = "sqlite:///data/sessions.db"
+
+
+def session_db_url() -> str | None:
+    """
+    SESSION_DB_URL, or a SQLite database on the shared data volume when several uvicorn workers
+    (WEB_CONCURRENCY > 1) serve requests, since a follow-up may land on another process.
+    None means bounded in-memory sessions.
+    """
+    db_url = os.getenv("SESSION_DB_URL")
+    if not db_url and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        db_url = DEFAULT_MULTI_WORKER_DB_URL
+    return db_url or None
+
+
+def is_sqlite_url(db_url: str) -> bool:
+    return db_url.startswith(("sqlite:", "sqlite+aiosqlite:"))
+
+
+def check_session_backend():
+    """
+    Raises at startup if the configured session backend's driver isn't installed, instead of
+    letting warm-up fail and every /chat answer with an error.
+    SQLite uses ADK's SqliteSessionService (aiosqlite, ADK >= 1.19.0); other URLs use
+    DatabaseSessionService (SQLAlchemy, the google-adk[db] extra on ADK 2.x).
+    """
+    db_url = session_db_url()
+    if not db_url:
+        return
+    if is_sqlite_url(db_url):
+        module, install = "aiosqlite", "google-adk>=1.19.0"
+    else:
+        module, install = "sqlalchemy", "google-adk[db]"
+    if find_spec(module) is None:
+        raise RuntimeError(
+            f"Session store {db_url} needs the '{module}' package (install {install}), "
+            "or unset SESSION_DB_URL / set WEB_CONCURRENCY=1 for in-memory sessions."
+        )
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Optional
+
+from google.adk.sessions import InMemorySessionService
+from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+from app.services.session_config import check_session_backend, is_sqlite_url, session_db_url
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedSessionService(InMemorySessionService):
+    """
+    In-memory ADK session service with LRU + TTL eviction and an approximate memory cap.
+
+    Every session carries its full event history (stringified email payloads, every draft
+    and critique), so an unbounded InMemorySessionService grows forever once the runner is
+    shared across requests. Sizes are estimated from the serialized state/events.
+    """
+
+    def __init__(self, max_sessions: int = None, max_bytes: int = None, ttl_seconds: int = None):
+        super().__init__()
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_COUNT", "200"))
+        self.max_bytes = max_bytes or int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("SESSION_TTL_SECONDS", str(2 * 3600)))
+        # (app_name, user_id, session_id) -> {"bytes": int, "last_access": float}, oldest first
+        self._lru: "OrderedDict[tuple[str, str, str], dict]" = OrderedDict()
+        self.evictions = 0
+
+    @staticmethod
+    def _estimate_bytes(obj: Any) -> int:
+        try:
+            if hasattr(obj, "model_dump_json"):
+                return len(obj.model_dump_json(exclude_none=True))
+            return len(json.dumps(obj, default=str))
+        except Exception:
+            return 0
+
+    def _touch(self, key: tuple[str, str, str], added_bytes: int = 0):
+        entry = self._lru.pop(key, {"bytes": 0})
+        entry["bytes"] += added_bytes
+        entry["last_access"] = time.monotonic()
+        self._lru[key] = entry
+
+    def _evict(self, keep: tuple[str, str, str] = None):
+        now = time.monotonic()
+        for key in [k for k, v in self._lru.items() if now - v["last_access"] > self.ttl_seconds and k != keep]:
+            self._drop(key)
+
+        while len(self._lru) > 1 and (len(self._lru) > self.max_sessions or self.bytes_held > self.max_bytes):
+            key = next(iter(self._lru))
+            if key == keep:
+                # Never evict the session that is being written to; drop the next oldest instead.
+                key = list(self._lru)[1]
+            self._drop(key)
+
+    def _drop(self, key: tuple[str, str, str]):
+        app_name, user_id, session_id = key
+        self._lru.pop(key, None)
+        self.evictions += 1
+        # Remove from the parent's storage directly so eviction does not re-enter our bookkeeping.
+        sessions = self.sessions.get(app_name, {}).get(user_id, {})
+        sessions.pop(session_id, None)
+        logger.info(f"Evicted session {session_id}")
+
+    @property
+    def bytes_held(self) -> int:
+        return sum(v["bytes"] for v in self._lru.values())
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None, session_id: Optional[str] = None):
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        key = (app_name, user_id, session.id)
+        self._touch(key, self._estimate_bytes(state or {}))
+        self._evict(keep=key)
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        key = (app_name, user_id, session_id)
+        entry = self._lru.get(key)
+        if entry and time.monotonic() - entry["last_access"] > self.ttl_seconds:
+            self._drop(key)
+            return None
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session and entry:
+            self._touch(key)
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str):
+        self._lru.pop((app_name, user_id, session_id), None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session, event):
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._lru:
+            self._touch(key, self._estimate_bytes(event))
+            self._evict(keep=key)
+        return event
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "live_sessions": len(self._lru),
+            "bytes_held": self.bytes_held,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+        }
+
+
+class PersistentSessionService(SqliteSessionService):
+    """
+    ADK's SQLite session service with the same TTL and count limits as BoundedSessionService.
+
+    Sessions idle longer than the TTL (and the oldest beyond SESSION_MAX_COUNT) are deleted from
+    the database, events included (ON DELETE CASCADE), at most every SESSION_PURGE_INTERVAL_SECONDS
+    when a session is created. Sessions updated within the last purge interval may still be in use
+    by another request, so the count limit never evicts them; the table can briefly exceed it
+    instead. The database is shared by all workers, so stats() reads it.
+    """
+
+    def __init__(self, path: str, max_sessions: int = None, ttl_seconds: int = None, purge_interval_seconds: int = None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # WAL (persisted in the file) lets the workers read while one of them writes
+        with closing(sqlite3.connect(path)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        super().__init__(db_path=path)
+        self.path = path
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_COUNT", "200"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("SESSION_TTL_SECONDS", str(2 * 3600)))
+        self.purge_interval_seconds = purge_interval_seconds or int(os.getenv("SESSION_PURGE_INTERVAL_SECONDS", "60"))
+        self._last_purge = 0.0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def purge(self) -> int:
+        """Deletes expired and over-limit sessions. Returns how many were removed."""
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        try:
+            with closing(self._connect()) as conn, conn:
+                removed = conn.execute("DELETE FROM sessions WHERE update_time < ?", (cutoff,)).rowcount
+                # Leave room for the session about to be created
+                overflow = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - (self.max_sessions - 1)
+                if overflow > 0:
+                    removed += conn.execute(
+                        "DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM sessions WHERE update_time < ? ORDER BY update_time LIMIT ?)",
+                        (now - self.purge_interval_seconds, overflow),
+                    ).rowcount
+        except sqlite3.OperationalError as e:
+            # Tables are created on ADK's first connection
+            logger.debug(f"Session purge skipped: {e}")
+            return 0
+        if removed:
+            self.evictions += removed
+            logger.info(f"Evicted {removed} persisted session(s)")
+        return removed
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None, session_id: Optional[str] = None):
+        if time.monotonic() - self._last_purge > self.purge_interval_seconds:
+            self._last_purge = time.monotonic()
+            try:
+                await asyncio.to_thread(self.purge)
+            except Exception as e:
+                logger.error(f"Failed to purge sessions: {e}")
+        return await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        # Expired but not purged yet: same answer as the in-memory store
+        if session and time.time() - session.last_update_time > self.ttl_seconds:
+            return None
+        return session
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": "sqlite",
+            "path": self.path,
+            "live_sessions": 0,
+            "events": 0,
+            "bytes_held": 0,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": self.evictions,
+        }
+        try:
+            with closing(self._connect()) as conn:
+                stats["live_sessions"] = conn.execute(
+                    "SELECT COUNT(*) FROM sessions WHERE update_time >= ?", (time.time() - self.ttl_seconds,)
+                ).fetchone()[0]
+                stats["events"], stats["bytes_held"] = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(event_data)), 0) FROM events").fetchone()
+        except sqlite3.OperationalError:
+            pass
+        return stats
+
+
+def create_session_service():
+    """
+    Bounded in-memory sessions by default. Set SESSION_DB_URL (e.g. "sqlite:///data/sessions.db")
+    to persist sessions so they can be resumed after a restart; with several uvicorn workers
+    (WEB_CONCURRENCY > 1) sessions default to a SQLite database on the shared data volume.
+    SQLite goes through ADK's SqliteSessionService (aiosqlite); other databases through
+    DatabaseSessionService (SQLAlchemy).
+    """
+    db_url = session_db_url()
+    if not db_url:
+        return BoundedSessionService()
+    check_session_backend()
+    logger.info(f"Using persistent session store: {db_url}")
+    if is_sqlite_url(db_url):
+        return PersistentSessionService(db_url.split(":///", 1)[-1])
+    from google.adk.sessions import DatabaseSessionService
+    return DatabaseSessionService(db_url=db_url)
+
+
+_session_service = None
+_session_service_lock = threading.Lock()
+
+
+def get_session_service():
+    """Process-wide session service shared by every runner."""
+    global _session_service
+    with _session_service_lock:
+        if _session_service is None:
+            _session_service = create_session_service()
+    return _session_service
+
+
+def session_stats() -> dict:
+    service = get_session_service()
+    if hasattr(service, "stats"):
+        return service.stats()
+    return {"backend": "database"}
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS embeddings (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    vector BLOB,
+    dim INTEGER,
+    timestamp REAL,
+    labels TEXT,
+    metadata TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS embeddings_seq ON embeddings (seq);
+"""
+
+
+class SharedStore:
+    """
+    Cross-process storage under the mounted `data/` volume (SQLite in WAL mode), so several
+    `uvicorn --workers N` processes share user context, digest/embedding caches and job state.
+
+    WAL lets readers proceed while one writer commits; read-modify-write helpers take
+    `BEGIN IMMEDIATE` so concurrent workers never lose each other's updates.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("SHARED_STORE_PATH", "data/albert.db")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (sqlite3 connections aren't shareable across threads).
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    # --- Key/value with optional TTL ---
+
+    def get(self, namespace: str, key: str, default=None):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if not row or (row[1] is not None and row[1] < time.time()):
+            return default
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value, ttl_seconds: float = None):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), now + ttl_seconds if ttl_seconds else None, now),
+            )
+
+    def delete(self, namespace: str, key: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> dict:
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (namespace, time.time()),
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def purge_expired(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)).rowcount
+
+    def update(self, namespace: str, key: str, fn, default=None, ttl_seconds: float = None):
+        """Atomically applies `fn(current) -> new` to a value across processes. Returns the new value."""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            current = json.loads(row[0]) if row and (row[1] is None or row[1] >= now) else default
+            new_value = fn(current)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(new_value, default=str), now + ttl_seconds if ttl_seconds else None, now),
+            )
+        return new_value
+
+    # --- Job leases ---
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Takes a named lease if it is free or expired (e.g. "only one worker runs today's digests").
+        Re-acquiring a lease you already own extends it.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value, expires_at FROM kv WHERE namespace = 'leases' AND key = ?", (name,)).fetchone()
+            if row and row[1] >= now and json.loads(row[0]) != owner:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES ('leases', ?, ?, ?, ?)",
+                (name, json.dumps(owner), now + ttl_seconds, now),
+            )
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = 'leases' AND key = ? AND value = ?", (name, json.dumps(owner)))
+
+    # --- Embeddings (shared by every worker's in-memory ANN index) ---
+
+    def put_embeddings(self, rows: list[tuple]) -> tuple[int, int]:
+        """rows: (id, vector_bytes, dim, timestamp, labels_list, metadata_dict). Returns the (first, last) seq written."""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM embeddings").fetchone()[0]
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (id, seq, vector, dim, timestamp, labels, metadata, deleted) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                [
+                    (doc_id, seq + i + 1, vector, dim, ts, json.dumps(labels or []), json.dumps(metadata or {}, default=str))
+                    for i, (doc_id, vector, dim, ts, labels, metadata) in enumerate(rows)
+                ],
+            )
+        return seq + 1, seq + len(rows)
+
+    def delete_embeddings(self, doc_ids: list[str]):
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM embeddings").fetchone()[0]
+            conn.executemany(
+                "UPDATE embeddings SET deleted = 1, vector = NULL, seq = ? WHERE id = ? AND deleted = 0",
+                [(seq + i + 1, doc_id) for i, doc_id in enumerate(doc_ids)],
+            )
+
+    def embeddings_since(self, seq: int) -> list[tuple]:
+        """Rows changed after `seq`, oldest first: (id, seq, vector, dim, timestamp, labels, metadata, deleted)."""
+        with self._connection() as conn:
+            return conn.execute(
+                "SELECT id, seq, vector, dim, timestamp, labels, metadata, deleted FROM embeddings WHERE seq > ? ORDER BY seq",
+                (seq,),
+            ).fetchall()
+
+
+class _Transaction:
+    """Commits on success / rolls back on error when a `BEGIN` was issued on the connection."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+_store: SharedStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> SharedStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SharedStore()
+    return _store
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import threading
+
+from app.services.cancellation import OperationCancelled
+
+logger = logging.getLogger(__name__)
+
+# name -> instance, so /metrics can report every coalescing point
+_registry: dict = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical blocking calls: the first caller for a key runs `fn`,
+    everyone else arriving while it is in flight waits and receives the same result (or error).
+    Used for work that runs in threads (semantic search, audio synthesis).
+    If the leader's work is cancelled (its client went away), waiters run it again themselves.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: dict = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def do(self, key, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.leaders += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            logger.info(f"[{self.name}] joining in-flight call for {key!r}")
+            call.done.wait()
+            if isinstance(call.error, OperationCancelled):
+                logger.info(f"[{self.name}] in-flight call for {key!r} was cancelled, retrying")
+                continue
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio flavour of SingleFlight. The shared work runs as its own task; a waiter that is
+    cancelled only detaches, and the task is cancelled once no waiters are left.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._tasks: dict = {}
+        _registry[name] = self
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        entry = self._tasks.get(key)
+        if entry is None:
+            task = asyncio.create_task(coro_fn(*args, **kwargs))
+            entry = self._tasks[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _t, key=key, entry=entry: self._tasks.pop(key, None) if self._tasks.get(key) is entry else None)
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"[{self.name}] joining in-flight request for {key!r}")
+
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            if entry["waiters"] == 1 and not entry["task"].done():
+                entry["task"].cancel()
+            raise
+        finally:
+            entry["waiters"] -= 1
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._tasks)}
+
+
+def single_flight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _registry.items()}
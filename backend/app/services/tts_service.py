@@ -1,74 +1,136 @@
 import os
 import uuid
+import hashlib
 import logging
-from google.cloud import texttospeech
-from google.cloud import storage
+from app.services.audio_profiles import AUDIO_PROFILES, audio_duration_seconds, resolve_profile, supports_speaking_rate
+from app.services.audio_storage import AudioStorage, get_audio_storage
+from app.services.cancellation import CancellationToken, OperationCancelled, cancellation_stats
+from app.services.rate_governor import get_rate_governor
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+_audio_flight = SingleFlight("generate_audio")
+
 class TextToSpeechService:
-    def __init__(self):
+    def __init__(self, storage: AudioStorage = None, voice_name: str = None):
+        # Imported lazily so importing this module (and main) stays cheap at cold start.
+        from google.cloud import texttospeech
+        self.texttospeech = texttospeech
+
         self.client = texttospeech.TextToSpeechClient()
+        # A pleasant, conversational voice by default; override with TTS_VOICE
+        self.voice_name = voice_name or os.getenv("TTS_VOICE", "en-US-Journey-D")
         self.voice = texttospeech.VoiceSelectionParams(
-            language_code="en-US",
-            name="en-US-Journey-D"  # A pleasant, conversational voice
-        )
-        self.audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
+            language_code="-".join(self.voice_name.split("-")[:2]),
+            name=self.voice_name
         )
+        # Encoding profiles (see app/services/audio_profiles.py); TTS_SPEAKING_RATE overrides all of them
+        self.speaking_rate_override = float(os.getenv("TTS_SPEAKING_RATE", "0")) or None
+        self._audio_configs = {}
         
-        # GCS Configuration
-        self.bucket_name = os.getenv("GCS_BUCKET_NAME", "albert-audio-assets-mvp")
-        self.storage_client = storage.Client()
-        self.bucket = self.storage_client.bucket(self.bucket_name)
+        # Storage backend (GCS by default, local disk with AUDIO_STORAGE_BACKEND=local)
+        self.storage = storage or get_audio_storage()
+        self.governor = get_rate_governor()
 
-    def generate_audio(self, text: str) -> str:
+    def speaking_rate(self, profile: str) -> float:
+        if not supports_speaking_rate(self.voice_name):
+            return 1.0
+        return self.speaking_rate_override or AUDIO_PROFILES[profile]["speaking_rate"]
+
+    def audio_config(self, profile: str):
+        if profile not in self._audio_configs:
+            settings = AUDIO_PROFILES[profile]
+            options = {
+                "audio_encoding": getattr(self.texttospeech.AudioEncoding, settings["encoding"]),
+                "sample_rate_hertz": settings["sample_rate_hz"],
+            }
+            rate = self.speaking_rate(profile)
+            if rate != 1.0:
+                options["speaking_rate"] = rate
+            if settings.get("effects_profile"):
+                options["effects_profile_id"] = [settings["effects_profile"]]
+            self._audio_configs[profile] = self.texttospeech.AudioConfig(**options)
+        return self._audio_configs[profile]
+
+    def generate_audio(self, text: str, profile: str = None, cancel_token: CancellationToken = None) -> str:
         """
-        Synthesizes speech from text and uploads it to GCS.
-        Returns the public URL to the audio file.
+        Synthesizes speech from text and stores it.
+        Returns the URL to the audio file.
         """
-        logger.info("Generating audio via Vertex AI TTS...")
+        filename = self.generate_audio_file(text, profile, cancel_token)
+        return self.get_audio_url(filename)
+
+    def generate_audio_file(self, text: str, profile: str = None, cancel_token: CancellationToken = None) -> str:
+        """
+        Synthesizes speech from text with an encoding profile (default: AUDIO_PROFILE) and stores
+        it via the audio storage backend.
+        Returns the object name, so callers (e.g. the digest cache) can re-sign it later.
+        Concurrent requests for the same text and profile share one synthesis + upload.
+        A cancelled `cancel_token` skips the synthesis, or the upload if synthesis already ran
+        (raises OperationCancelled).
+        """
+        profile = resolve_profile(profile)
+        key = hashlib.sha256(f"{profile}\0{text}".encode("utf-8")).hexdigest()
+        return _audio_flight.do(key, self._synthesize_and_store, text, profile, cancel_token)
+
+    def synthesize(self, text: str, profile: str) -> bytes:
+        """Returns the encoded audio for `text` without storing it."""
+        response = self.governor.call(
+            "tts",
+            self.client.synthesize_speech,
+            input=self.texttospeech.SynthesisInput(text=text),
+            voice=self.voice,
+            audio_config=self.audio_config(profile)
+        )
+        return response.audio_content
+
+    def object_metadata(self, profile: str, audio: bytes) -> dict:
+        """Describes how an object was encoded; stored with it (GCS metadata values are strings)."""
+        settings = AUDIO_PROFILES[profile]
+        duration = audio_duration_seconds(audio, settings["encoding"])
+        metadata = {
+            "audio_profile": profile,
+            "encoding": settings["encoding"],
+            "sample_rate_hz": settings["sample_rate_hz"],
+            "speaking_rate": self.speaking_rate(profile),
+            "voice": self.voice_name,
+            "size_bytes": len(audio),
+            "duration_seconds": round(duration, 2) if duration is not None else "",
+        }
+        return {key: str(value) for key, value in metadata.items()}
+
+    def _synthesize_and_store(self, text: str, profile: str, cancel_token: CancellationToken = None) -> str:
+        if cancel_token and cancel_token.cancelled:
+            cancellation_stats["tts_skipped"] += 1
+            cancellation_stats["tts_chars_saved"] += len(text)
+            cancel_token.raise_if_cancelled()
+        logger.info(f"Generating audio via Vertex AI TTS (profile '{profile}')...")
         
         try:
-            synthesis_input = texttospeech.SynthesisInput(text=text)
-
-            response = self.client.synthesize_speech(
-                input=synthesis_input,
-                voice=self.voice,
-                audio_config=self.audio_config
-            )
+            audio = self.synthesize(text, profile)
+            if cancel_token and cancel_token.cancelled:
+                cancellation_stats["uploads_skipped"] += 1
+                cancellation_stats["upload_bytes_saved"] += len(audio)
+                cancel_token.raise_if_cancelled()
 
             # Generate unique filename
-            filename = f"{uuid.uuid4()}.mp3"
-            
-            # Upload to GCS
-            logger.info(f"Uploading audio to GCS bucket: {self.bucket_name}")
-            blob = self.bucket.blob(filename)
-            blob.upload_from_string(response.audio_content, content_type="audio/mpeg")
-            
-            # Make public (optional, or use signed URL if private)
-            # For this MVP, we'll assume the bucket or object is accessible, 
-            # or we can generate a signed URL. Let's use signed URL for security by default.
-            
-            # Generate Signed URL (valid for 1 hour)
-            # Note: For a public podcast, you might want a public bucket.
-            # But for a personal assistant, a signed URL is better.
-            # However, the user asked for "remote CDN", so let's stick to a simple public URL structure 
-            # if the bucket allows, OR just return the signed URL.
+            settings = AUDIO_PROFILES[profile]
+            filename = f"{uuid.uuid4()}.{settings['extension']}"
             
-            # Let's try to make it public-read for simplicity if it's a "podcast"
-            # But `upload_from_string` doesn't make it public by default.
-            
-            # For now, let's use a signed URL which is safer and works without changing bucket IAM.
-            url = blob.generate_signed_url(
-                version="v4",
-                expiration=3600, # 1 hour
-                method="GET"
-            )
-            
-            logger.info(f"Audio uploaded successfully: {url}")
-            return url
+            self.storage.save(filename, audio, content_type=settings["content_type"], metadata=self.object_metadata(profile, audio))
+            logger.info(f"Audio stored successfully: {filename} ({len(audio)} bytes)")
+            return filename
 
+        except OperationCancelled:
+            logger.info("Audio request cancelled after synthesis, skipping upload")
+            raise
         except Exception as e:
             logger.error(f"Failed to generate/upload audio: {e}")
             raise e
+
+    def get_audio_url(self, filename: str) -> str:
+        """
+        Returns a playable URL for a previously stored audio file.
+        """
+        return self.storage.url_for(filename)
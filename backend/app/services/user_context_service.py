@@ -2,33 +2,47 @@ import json
 import os
 import logging
 
+from app.services.shared_store import get_shared_store
+
 logger = logging.getLogger(__name__)
 
+NAMESPACE = "user_context"
+
+
 class UserContextService:
-    def __init__(self, context_file: str = "data/user_context.json"):
+    """
+    User preferences (e.g. last used labels), kept in the shared SQLite store so every
+    uvicorn worker sees the same context. A legacy `data/user_context.json` is imported (and renamed) once.
+    """
+
+    def __init__(self, context_file: str = "data/user_context.json", user_id: str = "user", store=None):
         self.context_file = context_file
-        os.makedirs(os.path.dirname(self.context_file), exist_ok=True)
-        self._ensure_file_exists()
+        self.user_id = user_id
+        self.store = store or get_shared_store()
+        self._import_legacy_file()
 
-    def _ensure_file_exists(self):
-        if not os.path.exists(self.context_file):
-            with open(self.context_file, 'w') as f:
-                json.dump({}, f)
+    def _import_legacy_file(self):
+        if not os.path.exists(self.context_file) or self.store.get(NAMESPACE, self.user_id) is not None:
+            return
+        try:
+            with open(self.context_file, 'r') as f:
+                self.store.set(NAMESPACE, self.user_id, json.load(f))
+            os.replace(self.context_file, f"{self.context_file}.imported")
+            logger.info(f"Imported user context from {self.context_file}")
+        except Exception as e:
+            logger.error(f"Failed to import legacy context: {e}")
 
     def get_context(self) -> dict:
         try:
-            with open(self.context_file, 'r') as f:
-                return json.load(f)
+            return self.store.get(NAMESPACE, self.user_id, {})
         except Exception as e:
             logger.error(f"Failed to load context: {e}")
             return {}
 
     def update_context(self, updates: dict):
-        current = self.get_context()
-        current.update(updates)
         try:
-            with open(self.context_file, 'w') as f:
-                json.dump(current, f, indent=2)
+            # Read-modify-write under one transaction so concurrent workers don't drop each other's keys.
+            self.store.update(NAMESPACE, self.user_id, lambda current: {**(current or {}), **updates})
         except Exception as e:
             logger.error(f"Failed to save context: {e}")
 
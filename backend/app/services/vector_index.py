@@ -0,0 +1,312 @@
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class IVFFlatIndex:
+    """
+    Persistent approximate nearest-neighbor index (IVF-flat, pure NumPy) over email embeddings.
+
+    Vectors are L2-normalized, so inner product == cosine similarity. Rows are bucketed by their
+    nearest k-means centroid; a query scans only the `nprobe` closest buckets. Supports incremental
+    inserts, deletes (tombstones + periodic compaction) and date/label pre-filtering. Until enough
+    vectors exist to train centroids, and whenever filters leave few rows, search is exact.
+
+    With a `store` (SharedStore), every insert/delete is written through to SQLite and other
+    worker processes pick it up via `refresh()`; otherwise the index lives in memory only.
+    """
+
+    def __init__(self, nprobe: int = 16, min_train_size: int = 2000, exact_threshold: int = 2000, store=None):
+        self.store = store
+        self._store_seq = 0
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.exact_threshold = exact_threshold
+        self.dim = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._timestamps = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._size = 0
+        self.ids: list[str] = []
+        self.labels: list[frozenset] = []
+        self.metadata: dict[str, dict] = {}
+        self._row_of: dict[str, int] = {}
+        self.centroids = None
+        self._lists: list[np.ndarray] = []
+        self._trained_size = 0
+        self._lock = threading.RLock()
+        if store is not None:
+            self.refresh()
+
+    # --- Basic bookkeeping ---
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._row_of
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._alive):
+            return
+        capacity = max(needed, 2 * len(self._alive), 1024)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        for name, dtype in (("_timestamps", np.float64), ("_alive", bool), ("_assignments", np.int32)):
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, grown)
+
+    # --- Mutations ---
+
+    def add(self, doc_ids: list[str], vectors, timestamps: list[float], labels: list = None, metadata: list[dict] = None, persist: bool = True):
+        """Inserts (or replaces) documents. `timestamps` are epoch seconds of the email date."""
+        if not doc_ids:
+            return
+        vectors = self._normalize(vectors)
+        with self._lock:
+            if self.store is not None and persist:
+                self._write_through(doc_ids, vectors, timestamps, labels, metadata)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            for doc_id in doc_ids:
+                if doc_id in self._row_of:
+                    self._remove_locked(doc_id)
+
+            self._ensure_capacity(len(doc_ids))
+            start = self._size
+            end = start + len(doc_ids)
+            self._vectors[start:end] = vectors
+            self._timestamps[start:end] = timestamps
+            self._alive[start:end] = True
+            for i, doc_id in enumerate(doc_ids):
+                self._row_of[doc_id] = start + i
+                self.ids.append(doc_id)
+                self.labels.append(frozenset((labels[i] if labels else None) or ()))
+                if metadata:
+                    self.metadata[doc_id] = metadata[i]
+            self._size = end
+
+            if self.centroids is not None:
+                assigned = self._nearest_centroids(vectors, 1)[:, 0]
+                self._assignments[start:end] = assigned
+                for list_id in np.unique(assigned):
+                    rows = np.arange(start, end)[assigned == list_id]
+                    self._lists[list_id] = np.concatenate([self._lists[list_id], rows])
+            self._maybe_train()
+
+    def remove(self, doc_ids: list[str], persist: bool = True) -> int:
+        removed = 0
+        with self._lock:
+            if self.store is not None and persist:
+                try:
+                    self.store.delete_embeddings(list(doc_ids))
+                except Exception as e:
+                    logger.error(f"Failed to delete embeddings from shared store: {e}")
+            for doc_id in doc_ids:
+                if doc_id in self._row_of:
+                    self._remove_locked(doc_id)
+                    removed += 1
+            if removed:
+                # Compact once a fifth of the rows are tombstones.
+                if self._size and (self._size - len(self._row_of)) > 0.2 * self._size:
+                    self._compact()
+        return removed
+
+    def _remove_locked(self, doc_id: str):
+        row = self._row_of.pop(doc_id)
+        self._alive[row] = False
+        self.metadata.pop(doc_id, None)
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = self._vectors[keep].copy()
+        self._timestamps = self._timestamps[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._assignments = self._assignments[keep].copy()
+        self.ids = [self.ids[i] for i in keep]
+        self.labels = [self.labels[i] for i in keep]
+        self._size = len(keep)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._rebuild_lists()
+
+    # --- Training (k-means) ---
+
+    def _maybe_train(self):
+        n = len(self._row_of)
+        if n < self.min_train_size:
+            return
+        # Retrain when the collection has grown 4x since the last training.
+        if self.centroids is None or n > 4 * self._trained_size:
+            self.train()
+
+    def train(self, iterations: int = 10, seed: int = 0):
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            if len(rows) == 0:
+                return
+            nlist = max(1, int(np.sqrt(len(rows))))
+            rng = np.random.default_rng(seed)
+            sample = rows if len(rows) <= 50 * nlist else rng.choice(rows, 50 * nlist, replace=False)
+            data = self._vectors[sample]
+            centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assigned = np.argmax(data @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = data[assigned == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = self._normalize(centroids)
+            self.centroids = centroids
+            self._assignments[:self._size] = self._nearest_centroids(self._vectors[:self._size], 1)[:, 0]
+            self._rebuild_lists()
+            self._trained_size = len(rows)
+            logger.info(f"Trained IVF index: {nlist} lists over {len(rows)} vectors")
+
+    def _rebuild_lists(self):
+        if self.centroids is None:
+            self._lists = []
+            return
+        order = np.argsort(self._assignments[:self._size], kind="stable")
+        counts = np.bincount(self._assignments[:self._size], minlength=len(self.centroids))
+        self._lists = np.split(order, np.cumsum(counts)[:-1])
+
+    def _nearest_centroids(self, vectors: np.ndarray, nprobe: int) -> np.ndarray:
+        scores = vectors @ self.centroids.T
+        nprobe = min(nprobe, len(self.centroids))
+        top = np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(top, order, axis=1)
+
+    # --- Search ---
+
+    def _filter_mask(self, since: float = None, until: float = None, labels: list[str] = None) -> np.ndarray:
+        mask = self._alive[:self._size].copy()
+        if since is not None:
+            mask &= self._timestamps[:self._size] >= since
+        if until is not None:
+            mask &= self._timestamps[:self._size] <= until
+        if labels:
+            wanted = set(labels)
+            mask &= np.fromiter((bool(wanted & l) for l in self.labels[:self._size]), dtype=bool, count=self._size)
+        return mask
+
+    def _top_k(self, rows: np.ndarray, query: np.ndarray, k: int) -> list[tuple[str, float]]:
+        if len(rows) == 0:
+            return []
+        scores = self._vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+    def scores(self, query_vector, doc_ids: list[str]) -> dict[str, float]:
+        """Cosine similarity of the query to specific indexed documents (unknown ids are skipped)."""
+        with self._lock:
+            rows = [(doc_id, self._row_of[doc_id]) for doc_id in doc_ids if doc_id in self._row_of]
+            if not rows:
+                return {}
+            sims = self._vectors[[row for _, row in rows]] @ self._normalize(query_vector)
+            return {doc_id: float(sim) for (doc_id, _), sim in zip(rows, sims)}
+
+    def search_exact(self, query_vector, k: int = 10, since: float = None, until: float = None, labels: list[str] = None) -> list[tuple[str, float]]:
+        with self._lock:
+            if not self._size:
+                return []
+            query = self._normalize(query_vector)
+            return self._top_k(np.flatnonzero(self._filter_mask(since, until, labels)), query, k)
+
+    def search(self, query_vector, k: int = 10, since: float = None, until: float = None, labels: list[str] = None, nprobe: int = None) -> list[tuple[str, float]]:
+        """Returns up to k (doc_id, cosine) pairs, pre-filtered by email date range and labels."""
+        with self._lock:
+            if not self._size:
+                return []
+            query = self._normalize(query_vector)
+            mask = self._filter_mask(since, until, labels)
+            eligible = int(mask.sum())
+            if self.centroids is None or eligible <= self.exact_threshold:
+                return self._top_k(np.flatnonzero(mask), query, k)
+
+            nprobe = nprobe or self.nprobe
+            while True:
+                probes = self._nearest_centroids(query[None, :], nprobe)[0]
+                rows = np.concatenate([self._lists[p] for p in probes])
+                rows = rows[mask[rows]]
+                # Selective filters can starve the probed lists; widen the probe until k rows qualify.
+                if len(rows) >= k or nprobe >= len(self.centroids):
+                    return self._top_k(rows, query, k)
+                nprobe *= 2
+
+    # --- Shared store sync ---
+
+    def _write_through(self, doc_ids, vectors, timestamps, labels, metadata):
+        rows = [
+            (doc_id, vectors[i].tobytes(), vectors.shape[1], float(timestamps[i]),
+             list((labels[i] if labels else None) or ()), metadata[i] if metadata else {})
+            for i, doc_id in enumerate(doc_ids)
+        ]
+        try:
+            first_seq, last_seq = self.store.put_embeddings(rows)
+            # Our batch got a contiguous seq range; skip re-reading it unless other workers wrote in between.
+            if first_seq == self._store_seq + 1:
+                self._store_seq = last_seq
+        except Exception as e:
+            logger.error(f"Failed to write embeddings to shared store: {e}")
+
+    def refresh(self) -> int:
+        """Applies inserts/deletes made by other processes since the last refresh. Returns rows applied."""
+        if self.store is None:
+            return 0
+        try:
+            rows = self.store.embeddings_since(self._store_seq)
+        except Exception as e:
+            logger.error(f"Failed to read shared embeddings: {e}")
+            return 0
+        if not rows:
+            return 0
+        with self._lock:
+            deleted = [doc_id for doc_id, _, _, _, _, _, _, is_deleted in rows if is_deleted]
+            live = [row for row in rows if not row[7]]
+            if deleted:
+                self.remove(deleted, persist=False)
+            if live:
+                self.add(
+                    [row[0] for row in live],
+                    np.stack([np.frombuffer(row[2], dtype=np.float32, count=row[3]) for row in live]),
+                    [row[4] for row in live],
+                    labels=[json.loads(row[5]) for row in live],
+                    metadata=[json.loads(row[6]) for row in live],
+                    persist=False,
+                )
+            self._store_seq = max(self._store_seq, rows[-1][1])
+        logger.info(f"Synced {len(rows)} embedding changes from shared store ({len(self)} total)")
+        return len(rows)
+
+
+_index: IVFFlatIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> IVFFlatIndex:
+    """Process-wide index backed by the shared SQLite store, so all workers see the same embeddings."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            from app.services.shared_store import get_shared_store
+
+            _index = IVFFlatIndex(store=get_shared_store())
+    return _index
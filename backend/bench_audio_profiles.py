@@ -0,0 +1,80 @@
+"""
+Size and delivery cost of the audio encoding profiles (app/services/audio_profiles.py).
+
+Synthesizes the same digest with every profile through Google Cloud TTS and uploads each
+result to the configured storage backend, then reports bytes, synthesis and upload time
+normalized per minute of audio. Needs TTS credentials; uploads go to local disk unless
+--storage gcs is given (objects are deleted afterwards):
+
+    python bench_audio_profiles.py --runs 3
+    python bench_audio_profiles.py --storage gcs --text-file sample_digest.txt
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+
+from app.services.audio_profiles import AUDIO_PROFILES, FALLBACK_PROFILE, audio_duration_seconds
+
+logging.basicConfig(level=logging.WARNING)
+
+DIGEST = (
+    "Here's your digest. The week in AI was loud, and here's why it matters. "
+    "Export rules on AI accelerators tightened again, and the chip makers are already "
+    "routing around them. Meanwhile open-weight models closed most of the gap with the "
+    "frontier labs, which is great news for anyone building on a budget and awkward news "
+    "for anyone charging a premium. "
+) * 6
+
+
+def run(args):
+    if args.storage == "local":
+        os.environ.setdefault("LOCAL_AUDIO_DIR", os.path.join("data", "bench_audio"))
+    os.environ["AUDIO_STORAGE_BACKEND"] = args.storage
+
+    from app.services.audio_storage import create_audio_storage
+    from app.services.tts_service import TextToSpeechService
+
+    text = open(args.text_file).read() if args.text_file else DIGEST
+    storage = create_audio_storage()
+    tts = TextToSpeechService(storage=storage, voice_name=args.voice)
+    # MP3 first: the other profiles are reported relative to it
+    profiles = args.profiles or [FALLBACK_PROFILE] + [p for p in AUDIO_PROFILES if p != FALLBACK_PROFILE]
+
+    print(f"{len(text)} chars, voice {tts.voice_name}, storage {args.storage}, {args.runs} run(s) per profile")
+    print(f"{'profile':<9} {'encoding':<9} {'audio s':>8} {'KB':>8} {'KB/min':>8} {'kbps':>6} {'synth s/min':>12} {'upload s/min':>13}")
+    for profile in profiles:
+        settings = AUDIO_PROFILES[profile]
+        sizes, durations, synth, upload = [], [], [], []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            audio = tts.synthesize(text, profile)
+            synth.append(time.perf_counter() - started)
+
+            filename = f"bench-{uuid.uuid4()}.{settings['extension']}"
+            started = time.perf_counter()
+            storage.save(filename, audio, content_type=settings["content_type"], metadata=tts.object_metadata(profile, audio))
+            upload.append(time.perf_counter() - started)
+            storage.delete(filename)
+
+            sizes.append(len(audio))
+            durations.append(audio_duration_seconds(audio, settings["encoding"]) or 0.0)
+
+        minutes = sum(durations) / 60 or float("nan")
+        kb_per_min = sum(sizes) / 1024 / minutes
+        if profile == profiles[0]:
+            baseline = kb_per_min
+        print(f"{profile:<9} {settings['encoding']:<9} {sum(durations) / len(durations):>8.1f} {sum(sizes) / len(sizes) / 1024:>8.1f} "
+              f"{kb_per_min:>8.1f} {sum(sizes) * 8 / 1000 / (minutes * 60):>6.1f} {sum(synth) / minutes:>12.2f} {sum(upload) / minutes:>13.3f}"
+              f"{'' if profile == profiles[0] else f'  ({kb_per_min / baseline:.0%} of {profiles[0]})'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--profiles", nargs="+", choices=list(AUDIO_PROFILES), help="default: all, starting with mp3; the first is the baseline")
+    parser.add_argument("--storage", choices=["local", "gcs"], default="local")
+    parser.add_argument("--voice", default=None, help="TTS voice (default: TTS_VOICE or en-US-Journey-D)")
+    parser.add_argument("--text-file", default=None, help="digest text to synthesize")
+    run(parser.parse_args())
@@ -0,0 +1,149 @@
+"""
+Wall-clock and token cost of the refinement strategies: the serial Drafter -> Critic
+RefinementLoop vs. speculative parallel drafting (K drafts + one Judge + optional fix).
+
+Runs the real ADK agents offline against a scripted model whose latency is
+time-to-first-token + output_tokens / tokens_per_sec, so no API key is needed:
+
+    python bench_refinement.py --runs 5 --drafts 3
+    python bench_refinement.py --critic-approves-on 3 --judge-fix-rate 1.0
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import warnings
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.agents.agent_workflow import build_refinement_agent
+from app.services.context_cache import FakeContextCache, PromptPrefixCache, estimate_tokens
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+logging.basicConfig(level=logging.ERROR)
+
+EMAILS = str([
+    {"subject": f"Newsletter {i}: chips, models and policy", "sender": f"news{i}@example.com",
+     "body": "Export rules tighten on AI accelerators while open-weight models close the gap. " * 6}
+    for i in range(40)
+])
+DIGEST = "Here's your digest. " + "The week in AI was loud, and here's why it matters. " * 35
+FEEDBACK = "Tighten the opening and lead with the export-rule story; cut the second paragraph."
+
+
+class ScriptedLlm(BaseLlm):
+    """Plays Drafter / Critic / Judge based on the delta labels the prefix-cache callback sends."""
+
+    ttft: float = 0.6
+    tokens_per_sec: float = 150.0
+    critic_approves_on: int = 2
+    judge_requests_fix: bool = False
+    calls: list = []
+    critic_reviews: int = 0
+    # FakeContextCache.created: handle -> cached prefix size, for the cached token counts
+    cached_prefixes: dict = {}
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        contents = llm_request.contents or []
+        text = "\n".join(p.text for c in contents for p in (c.parts or []) if p.text)
+        tool_result = any(p.function_response for c in contents for p in (c.parts or []))
+        system = llm_request.config.system_instruction if llm_request.config else None
+        prompt_tokens = estimate_tokens(text) + (estimate_tokens(system) if isinstance(system, str) else 0)
+        handle = llm_request.config.cached_content if llm_request.config else None
+        cached_tokens = self.cached_prefixes[handle]["tokens"] if handle else 0
+
+        part, role = None, "drafter"
+        if "Draft to Review:" in text:
+            role = "critic"
+            if tool_result:
+                part = types.Part(text="Approved.")
+            else:
+                self.critic_reviews += 1
+                if self.critic_reviews >= self.critic_approves_on:
+                    part = types.Part(function_call=types.FunctionCall(name="exit_loop", args={}))
+                else:
+                    part = types.Part(text=FEEDBACK)
+        elif "Draft 1:" in text:
+            role = "judge"
+            fix = FEEDBACK if self.judge_requests_fix else ""
+            part = types.Part(text=json.dumps({"best": 2, "approved": not fix, "fix": fix}))
+        else:
+            part = types.Part(text=DIGEST)
+
+        output_tokens = estimate_tokens(part.text or "exit_loop()")
+        await asyncio.sleep(self.ttft + output_tokens / self.tokens_per_sec)
+        self.calls.append({"role": role, "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens, "output_tokens": output_tokens})
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens + cached_tokens,
+                cached_content_token_count=cached_tokens,
+                candidates_token_count=output_tokens,
+            ),
+        )
+
+
+async def run_once(strategy: str, drafts: int, model: ScriptedLlm, prefix_cache: PromptPrefixCache) -> dict:
+    model.calls = []
+    model.critic_reviews = 0
+    agent = build_refinement_agent(model, prefix_cache, strategy, drafts)
+    sessions = InMemorySessionService()
+    runner = Runner(app_name="agents", agent=agent, session_service=sessions)
+    session = await sessions.create_session(
+        app_name="agents", user_id="user",
+        state={"emails_content": EMAILS, "current_digest": "", "critique": ""},
+    )
+    started = time.perf_counter()
+    async for _ in runner.run_async(user_id="user", session_id=session.id, new_message=types.Content(role="user", parts=[types.Part(text="AI news")])):
+        pass
+    wall = time.perf_counter() - started
+    final = await sessions.get_session(app_name="agents", user_id="user", session_id=session.id)
+    assert final.state.get("current_digest"), f"{strategy} produced no digest"
+    return {
+        "wall_seconds": wall,
+        "llm_calls": len(model.calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in model.calls),
+        "cached_tokens": sum(c["cached_tokens"] for c in model.calls),
+        "output_tokens": sum(c["output_tokens"] for c in model.calls),
+    }
+
+
+async def main(args):
+    backend = FakeContextCache() if args.context_cache else None
+    print(f"ttft={args.ttft}s, {args.tokens_per_sec} tok/s, critic approves on review {args.critic_approves_on}, "
+          f"judge fix rate {args.judge_fix_rate:.0%}, context cache {'on' if backend else 'off'}")
+    print(f"{'strategy':<22} {'wall s':>8} {'calls':>6} {'prompt tok':>11} {'cached tok':>11} {'output tok':>11}")
+    for strategy, label in (("loop", "loop (serial x3)"), ("speculative", f"speculative (K={args.drafts})")):
+        model = ScriptedLlm(model="scripted", ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+                            critic_approves_on=args.critic_approves_on)
+        # Assigned, not passed: the model's constructor would copy the dict
+        model.cached_prefixes = backend.created if backend else {}
+        prefix_cache = PromptPrefixCache(backend=backend, min_tokens=0)
+        rows = []
+        for run in range(args.runs):
+            # The Judge asks for a fix in round(runs * fix_rate) of the runs.
+            model.judge_requests_fix = run < round(args.runs * args.judge_fix_rate)
+            rows.append(await run_once(strategy, args.drafts, model, prefix_cache))
+        mean = {key: sum(r[key] for r in rows) / len(rows) for key in rows[0]}
+        print(f"{label:<22} {mean['wall_seconds']:>8.2f} {mean['llm_calls']:>6.1f} {mean['prompt_tokens']:>11.0f} "
+              f"{mean['cached_tokens']:>11.0f} {mean['output_tokens']:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--drafts", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=0.6, help="seconds to first token per call")
+    parser.add_argument("--tokens-per-sec", type=float, default=150.0)
+    parser.add_argument("--critic-approves-on", type=int, default=2, help="loop: critic review that calls exit_loop (4 = never)")
+    parser.add_argument("--judge-fix-rate", type=float, default=0.3, help="speculative: share of runs where the Judge asks for a fix")
+    parser.add_argument("--context-cache", action="store_true", help="use FakeContextCache so the email prefix counts as cached")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""
+Recall@k vs. latency of the IVF-flat email index against exact (brute-force) search.
+
+Uses synthetic clustered embeddings shaped like text-embedding-004 output (768 dims),
+so it runs offline:
+
+    python bench_vector_index.py --n 20000 --queries 200 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.vector_index import IVFFlatIndex
+
+
+def synthetic_embeddings(n: int, dim: int, topics: int, rng) -> np.ndarray:
+    # Newsletters cluster by topic; add per-email noise around each topic center.
+    centers = rng.normal(size=(topics, dim))
+    assigned = rng.integers(0, topics, size=n)
+    return centers[assigned] + 0.6 * rng.normal(size=(n, dim))
+
+
+def run(n: int, dim: int, queries: int, k: int, topics: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_embeddings(n, dim, topics, rng)
+    now = time.time()
+    timestamps = now - rng.uniform(0, 180 * 86400, size=n)  # ~6 months of mail
+    ids = [f"msg-{i}" for i in range(n)]
+
+    index = IVFFlatIndex(min_train_size=min(2000, n), exact_threshold=0)
+    started = time.perf_counter()
+    index.add(ids, vectors, timestamps.tolist())
+    build_seconds = time.perf_counter() - started
+    print(f"Indexed {n} x {dim} vectors in {build_seconds:.2f}s ({len(index.centroids)} lists)")
+
+    query_vectors = synthetic_embeddings(queries, dim, topics, rng)
+    scenarios = [("all history", None), ("last 30 days", now - 30 * 86400)]
+
+    for name, since in scenarios:
+        exact_started = time.perf_counter()
+        truth = [set(doc_id for doc_id, _ in index.search_exact(q, k=k, since=since)) for q in query_vectors]
+        exact_ms = (time.perf_counter() - exact_started) * 1000 / queries
+
+        print(f"\n[{name}] exact: {exact_ms:.2f} ms/query")
+        print(f"{'nprobe':>8} {'recall@' + str(k):>10} {'ms/query':>10} {'speedup':>8}")
+        for nprobe in (1, 2, 4, 8, 16, 32):
+            ann_started = time.perf_counter()
+            results = [index.search(q, k=k, since=since, nprobe=nprobe) for q in query_vectors]
+            ann_ms = (time.perf_counter() - ann_started) * 1000 / queries
+            recall = np.mean([len(truth[i] & {doc_id for doc_id, _ in r}) / max(1, len(truth[i])) for i, r in enumerate(results)])
+            print(f"{nprobe:>8} {recall:>10.3f} {ann_ms:>10.2f} {exact_ms / ann_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=200)
+    args = parser.parse_args()
+    run(args.n, args.dim, args.queries, args.k, args.topics)
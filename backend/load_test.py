@@ -0,0 +1,150 @@
+"""
+Throughput vs. uvicorn worker count.
+
+Starts `uvicorn main:app --workers N` for each N against a throwaway shared store, waits until
+/ready answers 200 (every worker finished warm-up), drives it with keep-alive HTTP clients in
+separate processes (so the client's GIL isn't the bottleneck) and reports requests/sec and latency.
+
+The default target is POST /chat, the path that writes concurrently to the shared store (sessions,
+user context, embeddings), so it needs the same Gmail/Gemini credentials as the app. Identical
+concurrent messages are coalesced within a worker. "Backend Error" replies count as errors, and
+the run fails above --max-error-rate. Other paths are fetched with GET:
+
+    python load_test.py --workers 1,2 --clients 8 --duration 120
+    python load_test.py --path /digests/stats --duration 15 --min-speedup 1.5
+"""
+import json
+import argparse
+import http.client
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+REQUEST_TIMEOUT_SECONDS = 300
+
+
+def client(port: int, path: str, message: str, duration: float, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT_SECONDS)
+    method, body, headers = "GET", None, {}
+    if path == "/chat":
+        method, body, headers = "POST", json.dumps({"message": message}), {"Content-Type": "application/json"}
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+            # /chat reports pipeline failures as a 200 with a "Backend Error" response
+            if response.status != 200 or b"Backend Error" in payload:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT_SECONDS)
+    results.put((latencies, errors))
+
+
+def wait_until_ready(port: int, workers: int, timeout: float):
+    """
+    Waits for /ready to answer 200 several times in a row: requests land on arbitrary workers, so
+    one 200 doesn't mean every worker finished warm-up. Raises with the last /ready body otherwise.
+    """
+    deadline = time.monotonic() + timeout
+    needed, streak, last = 4 * workers, 0, "no response"
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/ready")
+            response = conn.getresponse()
+            last = response.read().decode(errors="replace")
+            streak = streak + 1 if response.status == 200 else 0
+            if streak >= needed:
+                return
+        except OSError:
+            streak = 0
+        time.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} with {workers} worker(s) not ready within {timeout}s: {last}")
+
+
+def run(workers: int, port: int, path: str, message: str, clients: int, duration: float, ready_timeout: float, data_dir: str) -> dict:
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        SHARED_STORE_PATH=os.path.join(data_dir, "albert.db"),
+        SESSION_DB_URL=f"sqlite:///{os.path.join(data_dir, 'sessions.db')}",
+        ENABLE_DIGEST_SCHEDULER="false",
+        ENABLE_EMAIL_INGESTION="false",
+        ENABLE_CLOUD_TRACE="false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        wait_until_ready(port, workers, ready_timeout)
+        results = mp.Queue()
+        procs = [mp.Process(target=client, args=(port, path, message, duration, results)) for _ in range(clients)]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = np.array([l for lats, _ in collected for l in lats])
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in collected),
+        "rps": len(latencies) / duration,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95) * 1000) if len(latencies) else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--path", default="/chat", help="POST /chat (default), any other path is fetched with GET")
+    parser.add_argument("--message", default="Make me a podcast about AI news from the last 3 days.", help="/chat message")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--ready-timeout", type=float, default=180.0, help="seconds to wait for /ready on every worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--min-speedup", type=float, default=0.0,
+                        help="fail unless the largest worker count reaches this speedup over the smallest")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="fail if any run has more errors than this")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    method = "POST" if args.path == "/chat" else "GET"
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:.0f}s per run, {method} {args.path}")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'speedup':>8}")
+    rows = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        for workers in worker_counts:
+            row = run(workers, args.port, args.path, args.message, args.clients, args.duration, args.ready_timeout, data_dir)
+            rows.append(row)
+            speedup = row["rps"] / rows[0]["rps"] if rows[0]["rps"] else 0.0
+            print(f"{workers:>8} {row['rps']:>10.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['errors']:>7} {speedup:>7.2f}x")
+
+    failed = [row for row in rows if row["errors"] > args.max_error_rate * max(row["requests"], 1)]
+    if failed:
+        print(f"FAIL: error rate above {args.max_error_rate:.0%} with {', '.join(str(row['workers']) for row in failed)} worker(s)")
+        sys.exit(1)
+    final_speedup = rows[-1]["rps"] / rows[0]["rps"] if rows[0]["rps"] else 0.0
+    if final_speedup < args.min_speedup:
+        print(f"FAIL: {worker_counts[-1]} workers reached {final_speedup:.2f}x, expected >= {args.min_speedup}x")
+        sys.exit(1)
@@ -1,5 +1,8 @@
 from fastapi import FastAPI
 import os
+import time
+import asyncio
+import threading
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
@@ -9,15 +12,19 @@ load_dotenv()
 import logging
 logging.basicConfig(level=logging.INFO)
 
+ENABLE_CLOUD_TRACE = os.getenv("ENABLE_CLOUD_TRACE", "false").lower() == "true"
+
 # OpenTelemetry Setup
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.sdk.resources import Resource
-
-if os.getenv("ENABLE_CLOUD_TRACE", "false").lower() == "true":
+# The SDK, Cloud Trace exporter and FastAPI instrumentor are only imported when tracing is on;
+# they dominate cold-start import time otherwise.
+def setup_tracing(app: FastAPI):
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.sdk.resources import Resource
+
     resource = Resource.create({
         "service.name": os.getenv("OTEL_SERVICE_NAME", "albert-concierge")
     })
@@ -28,20 +35,84 @@ if os.getenv("ENABLE_CLOUD_TRACE", "false").lower() == "true":
         BatchSpanProcessor(cloud_trace_exporter)
     )
     trace.set_tracer_provider(tracer_provider)
+    FastAPIInstrumentor.instrument_app(app)
 
 
+_concierge_agent = None
+_concierge_lock = threading.Lock()
+
+def get_concierge_agent():
+    """The agent (and its runner/session service) is shared across requests."""
+    global _concierge_agent
+    with _concierge_lock:
+        if _concierge_agent is None:
+            # Imported here: the agent modules load ADK, which `import main` must not pull in.
+            from app.agents.concierge_agent import ConciergeAgent
+            print("Initializing ConciergeAgent...")
+            _concierge_agent = ConciergeAgent()
+    return _concierge_agent
+
+async def warm_up(app: FastAPI):
+    """
+    Loads the heavy integrations (ADK, TTS, GCS, Cloud Logging) off the event loop after startup,
+    so the process starts serving /health immediately and /ready flips once it is warm.
+    """
+    started = time.perf_counter()
+    try:
+        # Enforce audio retention (48h) for whichever storage backend is configured
+        from app.services.audio_storage import get_audio_storage, run_reaper
+        storage = await asyncio.to_thread(get_audio_storage)
+        app.state.reaper_task = asyncio.create_task(run_reaper(storage))
+    except Exception as e:
+        logging.warning(f"Audio reaper disabled: {e}")
+
+    try:
+        await asyncio.to_thread(get_concierge_agent)
+        app.state.ready = True
+    except Exception as e:
+        app.state.warmup_error = str(e)
+        logging.error(f"Warm-up failed: {e}")
+    app.state.warmup_seconds = round(time.perf_counter() - started, 3)
+    logging.info(f"Warm-up finished in {app.state.warmup_seconds}s")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # A missing session store driver stops the process here rather than failing every /chat
+    from app.services.session_config import check_session_backend
+    check_session_backend()
+
+    from app.services.digest_scheduler import DigestScheduler
+    app.state.digest_scheduler = DigestScheduler(agent_factory=get_concierge_agent)
+    if os.getenv("ENABLE_DIGEST_SCHEDULER", "false").lower() == "true":
+        app.state.digest_scheduler.start()
+
+    # Backfills older mail into the persistent email index and keeps it in sync with Gmail
+    from app.services.email_ingestor import EmailIngestor
+    app.state.email_ingestor = EmailIngestor()
+    if os.getenv("ENABLE_EMAIL_INGESTION", "false").lower() == "true":
+        app.state.email_ingestor.start()
+
+    app.state.ready = False
+    app.state.warmup_error = None
+    app.state.warmup_seconds = None
+    app.state.reaper_task = None
+    warmup_task = asyncio.create_task(warm_up(app))
     yield
     # Shutdown
+    warmup_task.cancel()
+    await app.state.digest_scheduler.stop()
+    await app.state.email_ingestor.stop()
+    if app.state.reaper_task:
+        app.state.reaper_task.cancel()
 
 app = FastAPI(title="Personal News Digest Assistant API", lifespan=lifespan)
 
-if os.getenv("ENABLE_CLOUD_TRACE", "false").lower() == "true":
-    FastAPIInstrumentor.instrument_app(app)
+if ENABLE_CLOUD_TRACE:
+    setup_tracing(app)
 
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
 
 # CORS Setup
 app.add_middleware(
@@ -63,36 +134,107 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
-from fastapi.responses import FileResponse
+@app.get("/ready")
+def readiness_check():
+    """Readiness (vs. liveness on /health): 503 until warm-up has loaded the agent pipeline."""
+    body = {
+        "ready": app.state.ready,
+        "warmup_seconds": app.state.warmup_seconds,
+        "error": app.state.warmup_error
+    }
+    return JSONResponse(body, status_code=200 if app.state.ready else 503)
+
+@app.post("/digests/precompute")
+async def precompute_digests(wait: bool = False):
+    """Manually triggers the digest pre-computation run."""
+    scheduler = app.state.digest_scheduler
+    if wait:
+        return await scheduler.run_once(trigger="manual")
+    scheduler.trigger()
+    return {"status": "started"}
+
+@app.get("/metrics")
+def metrics():
+    from app.services.session_store import session_stats
+    from app.services.rate_governor import get_rate_governor
+    from app.services.single_flight import single_flight_stats
+    from app.services.context_cache import get_prefix_cache
+    from app.agents.email_aggregator import retrieval_stats
+    from app.services.model_router import get_model_router
+    from app.services.cancellation import cancellation_metrics
+    return {
+        "sessions": session_stats(),
+        "rate_limits": get_rate_governor().metrics(),
+        "single_flight": single_flight_stats(),
+        "context_cache": get_prefix_cache().stats(),
+        "retrieval": dict(retrieval_stats),
+        "model_router": get_model_router().stats(),
+        "cancellation": cancellation_metrics(),
+        "ingestion": app.state.email_ingestor.stats()
+    }
+
+@app.get("/digests/stats")
+def digest_stats():
+    return app.state.digest_scheduler.stats()
+
+from fastapi import Request
+
+@app.api_route("/download/{filename}", methods=["GET", "HEAD"])
+async def download_audio(filename: str, request: Request):
+    from app.services.audio_storage import LocalAudioStorage, DEFAULT_RETENTION_SECONDS
+    from app.services.file_serving import ranged_file_response
 
-@app.get("/download/{filename}")
-async def download_audio(filename: str):
-    file_path = os.path.join("static", "audio", filename)
-    if os.path.exists(file_path):
-        return FileResponse(
-            path=file_path, 
-            filename=filename, 
-            media_type='audio/mpeg', 
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    return {"error": "File not found"}
+    try:
+        file_path = LocalAudioStorage().path_for(filename)
+    except ValueError:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+    retention = int(os.getenv("AUDIO_RETENTION_SECONDS", str(DEFAULT_RETENTION_SECONDS)))
+    return await ranged_file_response(request, file_path, filename, retention_seconds=retention)
 
 from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: str | None = None
+    # "speech" (Ogg Opus), "compact" or "mp3"; defaults to AUDIO_PROFILE, MP3 for clients without Opus
+    audio_profile: str | None = None
+
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1.0"))
+
+async def cancel_on_disconnect(http_request: Request, work: asyncio.Task) -> bool:
+    """Cancels `work` if the client goes away before it finishes. Returns True if it did."""
+    while not work.done():
+        if await http_request.is_disconnected():
+            logging.info("Client disconnected from /chat, cancelling the request")
+            work.cancel()
+            return True
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    return False
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    from app.services.audio_profiles import resolve_profile
     try:
-        from app.agents.concierge_agent import ConciergeAgent
-        print("Initializing ConciergeAgent...")
-        agent = ConciergeAgent()
+        # Off the event loop: the first call may still be waiting on warm-up
+        agent = await asyncio.to_thread(get_concierge_agent)
         print("Processing request...")
-        response = await agent.process_request(request.message)
-        return response
+        audio_profile = resolve_profile(request.audio_profile, http_request.headers.get("user-agent"))
+        # A closed tab or aborted fetch cancels the pipeline, Gmail/embedding work and TTS (coalesced
+        # duplicates keep running while another client still waits on them).
+        work = asyncio.ensure_future(agent.process_request(request.message, session_id=request.session_id, audio_profile=audio_profile))
+        watcher = asyncio.create_task(cancel_on_disconnect(http_request, work))
+        try:
+            return await work
+        except asyncio.CancelledError:
+            if watcher.done() and not watcher.cancelled() and watcher.result():
+                # Nobody is listening; 499 is the de-facto "client closed request" status
+                return JSONResponse({"error": "Client disconnected"}, status_code=499)
+            work.cancel()
+            raise
+        finally:
+            watcher.cancel()
     except Exception as e:
         import traceback
         print(f"CRITICAL ERROR in /chat: {e}")
         traceback.print_exc()
-        return {"response": f"Backend Error: {str(e)}", "session_id": "error", "model": "error"}
+        return {"response": f"Backend Error: {str(e)}", "session_id": "error", "model": "error", "models": {}}
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from app.agents.agent_workflow import CRITIC_INSTRUCTION, DRAFTER_INSTRUCTION
+from app.services.context_cache import FakeContextCache, PromptPrefixCache, estimate_tokens
+
+# Roughly what the Drafter's stable prefix looks like: instructions + a stringified inbox.
+EMAILS = "\n".join(f"Subject: Newsletter {i}\nSnippet: {'AI chips export rules ' * 20}" for i in range(40))
+PREFIX = f"You are an expert news editor.\nInput Emails: {EMAILS}"
+
+
+def test_refinement_loop_reuses_cached_prefix():
+    backend = FakeContextCache()
+    cache = PromptPrefixCache(backend=backend, ttl_seconds=600, min_tokens=1024)
+
+    # 3 Drafter + 3 Critic turns share two prefixes -> 2 creations, 4 hits.
+    handles = [cache.get_handle("gemini-2.5-flash", PREFIX + agent) for _ in range(3) for agent in ("drafter", "critic")]
+
+    assert len(backend.created) == 2
+    assert len(set(handles)) == 2
+    assert cache.stats()["hits"] == 4
+    assert cache.stats()["hit_rate"] == round(4 / 6, 3)
+
+
+def test_parallel_lookups_create_the_prefix_once():
+    class SlowFakeContextCache(FakeContextCache):
+        def create(self, *args, **kwargs):
+            time.sleep(0.2)
+            return super().create(*args, **kwargs)
+
+    backend = SlowFakeContextCache()
+    cache = PromptPrefixCache(backend=backend, ttl_seconds=600, min_tokens=1024)
+
+    # Speculative drafters all miss at once; only the first one creates the cache.
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(cache.get_handle("gemini-2.5-flash", PREFIX))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(backend.created) == 1
+    assert len(set(handles)) == 1
+    assert (cache.stats()["misses"], cache.stats()["hits"]) == (1, 2)
+
+
+USER_REQUEST = "AI news from the last week, as three bullets"
+
+
+class FakeCallbackContext:
+    def __init__(self, agent_name: str, state: dict):
+        self.agent_name = agent_name
+        self.state = state
+        self.user_content = types.Content(role="user", parts=[types.Part(text=USER_REQUEST)])
+
+
+EXIT_LOOP_TOOLS = [types.Tool(function_declarations=[types.FunctionDeclaration(name="exit_loop", description="Ends the loop.")])]
+
+
+def _request(instruction: str, state: dict, contents: list, tools=None) -> LlmRequest:
+    # What ADK hands the before_model callback: state injected into the instruction, plus history.
+    config = types.GenerateContentConfig(system_instruction=instruction.replace("{{emails_content}}", state["emails_content"]), tools=tools)
+    return LlmRequest(model="gemini-2.5-flash", contents=list(contents), config=config)
+
+
+def test_loop_callbacks_send_constant_prompt_per_iteration():
+    backend = FakeContextCache()
+    cache = PromptPrefixCache(backend=backend, ttl_seconds=600, min_tokens=1024)
+    drafter = cache.callback({"Current Draft": "current_digest", "Critique": "critique"})
+    critic = cache.callback({"Draft to Review": "current_digest"})
+    state = {"emails_content": EMAILS, "current_digest": "", "critique": ""}
+    history = [types.Content(role="user", parts=[types.Part(text=USER_REQUEST)])]
+
+    async def run_loop():
+        for iteration in range(3):
+            request = _request(DRAFTER_INSTRUCTION, state, history)
+            await drafter(FakeCallbackContext("Drafter", state), request)
+            # Drafter: prefix served from the cache, only the user's request and the draft/critique delta are sent.
+            assert request.config.cached_content and request.config.system_instruction is None
+            assert [c.parts[0].text for c in request.contents] == [
+                f"Request: {USER_REQUEST}\n\nCurrent Draft: {state['current_digest']}\n\nCritique: {state['critique']}"
+            ]
+            state["current_digest"] = f"Draft {iteration + 1}: " + "chips, rules and open models " * 30
+            history.append(types.Content(role="model", parts=[types.Part(text=state["current_digest"])]))
+
+            tool_turns = []
+            if iteration == 2:
+                # Second Critic call of the last iteration: after it asked for exit_loop.
+                tool_turns = [
+                    types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="exit_loop", args={}))]),
+                    types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name="exit_loop", response={}))]),
+                ]
+            request = _request(CRITIC_INSTRUCTION, state, history + tool_turns, tools=EXIT_LOOP_TOOLS)
+            await critic(FakeCallbackContext("Critic", state), request)
+            # Critic: inbox-free prefix, below the cache minimum, so it's sent as is with its tools.
+            assert request.config.cached_content is None and request.config.tools == EXIT_LOOP_TOOLS
+            assert request.contents[1:] == tool_turns
+            state["critique"] = f"Critique {iteration + 1}: " + "punchier intro, fewer numbers " * 10
+            history.append(types.Content(role="model", parts=[types.Part(text=state["critique"])]))
+
+    asyncio.run(run_loop())
+
+    assert len(backend.created) == 1
+    assert (cache.stats()["misses"], cache.stats()["hits"]) == (1, 2)
+    per_iteration = [sum(call["prompt_tokens"] for call in cache.calls[i:i + 2]) for i in range(0, 6, 2)]
+    # Once there is a draft and a critique, each iteration costs the same; the inbox is never resent.
+    assert per_iteration[1] == per_iteration[2]
+    assert max(per_iteration) < estimate_tokens(EMAILS) / 5
+
+
+def test_cached_prefix_strips_instruction_and_tools():
+    cache = PromptPrefixCache(backend=FakeContextCache(), min_tokens=0)
+    state = {"emails_content": EMAILS, "current_digest": "Draft", "critique": ""}
+    tool_turn = types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(name="exit_loop", response={}))])
+    request = _request(CRITIC_INSTRUCTION, state, [types.Content(role="model", parts=[types.Part(text="old draft")]), tool_turn], tools=EXIT_LOOP_TOOLS)
+    request.config.tool_config = types.ToolConfig(function_calling_config=types.FunctionCallingConfig(mode="AUTO"))
+
+    asyncio.run(cache.callback({"Draft to Review": "current_digest"})(FakeCallbackContext("Critic", state), request))
+
+    # Cached content carries instruction and tools; the request may not repeat them.
+    config = request.config
+    assert config.cached_content and (config.system_instruction, config.tools, config.tool_config) == (None, None, None)
+    assert request.contents[0].parts[0].text == f"Request: {USER_REQUEST}\n\nDraft to Review: Draft"
+    assert request.contents[1:] == [tool_turn]
+
+
+def test_small_prefixes_are_not_cached():
+    cache = PromptPrefixCache(backend=FakeContextCache(), min_tokens=1024)
+    assert cache.get_handle("gemini-2.5-flash", "too short") is None
+    assert cache.stats()["skipped_below_min_tokens"] == 1
+
+
+if __name__ == "__main__":
+    test_refinement_loop_reuses_cached_prefix()
+    test_parallel_lookups_create_the_prefix_once()
+    test_loop_callbacks_send_constant_prompt_per_iteration()
+    test_cached_prefix_strips_instruction_and_tools()
+    test_small_prefixes_are_not_cached()
+    print(f"Prefix size: ~{estimate_tokens(PREFIX)} tokens. All context cache checks passed.")
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.services.audio_storage import GCSAudioStorage, LocalAudioStorage, run_reaper
+from app.services.file_serving import ranged_file_response
+from app.services.shared_store import SharedStore
+
+AUDIO = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def client():
+    # Same wiring as main's /download route, over a temporary LocalAudioStorage.
+    with tempfile.TemporaryDirectory() as directory:
+        storage = LocalAudioStorage(directory=directory)
+        storage.save("digest.mp3", AUDIO)
+        app = FastAPI()
+
+        @app.api_route("/download/{filename}", methods=["GET", "HEAD"])
+        async def download(filename: str, request: Request):
+            try:
+                path = storage.path_for(filename)
+            except ValueError:
+                return JSONResponse({"error": "File not found"}, status_code=404)
+            return await ranged_file_response(request, path, filename, retention_seconds=3600)
+
+        yield TestClient(app)
+
+
+def test_full_download(client):
+    response = client.get("/download/digest.mp3")
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "audio/mpeg"
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=10000-", 10000, 10239),
+    ("bytes=-240", 10000, 10239),
+    ("bytes=10200-99999", 10200, 10239),
+])
+def test_range_returns_partial_content(client, range_header, start, end):
+    response = client.get("/download/digest.mp3", headers={"Range": range_header})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(AUDIO)}"
+    assert response.content == AUDIO[start:end + 1]
+
+
+@pytest.mark.parametrize("range_header", ["bytes=10240-", "bytes=99999-100000", "bytes=-0"])
+def test_unsatisfiable_range(client, range_header):
+    response = client.get("/download/digest.mp3", headers={"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+
+@pytest.mark.parametrize("range_header", ["items=0-9", "bytes=0-9,20-29", "bytes=9-0", "bytes=-", "garbage"])
+def test_unsupported_range_is_ignored(client, range_header):
+    # RFC 9110: unknown units, multiple ranges and invalid ranges are ignored, not rejected.
+    response = client.get("/download/digest.mp3", headers={"Range": range_header})
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+
+def test_conditional_get(client):
+    etag = client.get("/download/digest.mp3").headers["etag"]
+    response = client.get("/download/digest.mp3", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/download/digest.mp3", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_range(client):
+    etag = client.get("/download/digest.mp3").headers["etag"]
+    fresh = client.get("/download/digest.mp3", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert fresh.status_code == 206
+    assert fresh.content == AUDIO[:10]
+    # The file changed since the client cached it: resuming would mix versions, so send it all.
+    stale = client.get("/download/digest.mp3", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == AUDIO
+
+
+def test_missing_file(client):
+    assert client.get("/download/other.mp3").status_code == 404
+
+
+@pytest.mark.parametrize("filename", ["../secret.mp3", "a/../../secret.mp3", ".digest.mp3.json", "..", ""])
+def test_path_traversal_is_rejected(filename):
+    storage = LocalAudioStorage(directory=tempfile.mkdtemp())
+    with pytest.raises(ValueError):
+        storage.path_for(filename)
+
+
+def test_traversal_through_route(client):
+    assert client.get("/download/..%2F..%2Fetc%2Fpasswd").status_code == 404
+    assert client.get("/download/.digest.mp3.json").status_code == 404
+
+
+def test_local_storage_roundtrip():
+    storage = LocalAudioStorage(directory=tempfile.mkdtemp(), base_url="http://testserver/")
+    storage.save("digest.ogg", b"OggS", content_type="audio/ogg", metadata={"profile": "speech"})
+    assert open(storage.path_for("digest.ogg"), "rb").read() == b"OggS"
+    assert storage.get_metadata("digest.ogg") == {"content_type": "audio/ogg", "profile": "speech"}
+    assert storage.url_for("digest.ogg") == "http://testserver/download/digest.ogg"
+    assert not os.path.exists(storage.path_for("digest.ogg") + ".tmp")
+
+
+class FakeBlob:
+    def __init__(self, name: str, age_hours: float, metadata: dict = None):
+        self.name = name
+        self.time_created = datetime.now(timezone.utc) - timedelta(hours=age_hours)
+        self.metadata = metadata
+
+
+def test_gcs_reap_only_removes_expired_digests():
+    # Shared bucket: unrelated objects (no audio_profile metadata) are never touched.
+    blobs = [
+        FakeBlob("old-digest.ogg", 72, {"audio_profile": "speech"}),
+        FakeBlob("new-digest.ogg", 1, {"audio_profile": "speech"}),
+        FakeBlob("backup.tar", 72),
+        FakeBlob("report.pdf", 72, {"owner": "finance"}),
+    ]
+    storage = GCSAudioStorage.__new__(GCSAudioStorage)
+    storage.bucket_name = "shared"
+    storage.storage_client = type("Client", (), {"list_blobs": lambda self, bucket: list(blobs)})()
+    deleted = []
+    storage.delete = deleted.append
+
+    assert storage.reap(48 * 3600) == 1
+    assert deleted == ["old-digest.ogg"]
+
+
+def test_only_one_worker_reaps():
+    store = SharedStore(os.path.join(tempfile.mkdtemp(), "albert.db"))
+    # Another worker holds the lease for this interval
+    assert store.acquire_lease("audio_reaper", "other-worker", 3600)
+    reaped = []
+    storage = type("Storage", (), {"reap": lambda self, max_age: reaped.append(max_age) or 0})()
+
+    async def run_briefly():
+        task = asyncio.create_task(run_reaper(storage, retention_seconds=60, interval_seconds=3600, store=store))
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(run_briefly())
+    assert reaped == []
+    store.release_lease("audio_reaper", "other-worker")
+    asyncio.run(run_briefly())
+    assert reaped == [60]
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from app.services.gmail_query import build_gmail_queries, derive_filters
+
+NOW = datetime(2026, 10, 19)
+
+
+def test_only_from_names_a_sender():
+    assert derive_filters("AI news grouped by topic") == {"keywords": ["ai"], "senders": [], "categories": []}
+    assert derive_filters("AI news from The Verge")["senders"] == ["verge"]
+
+
+def test_passes_widen_down_to_date_only():
+    queries = build_gmail_queries("AI news from The Verge", 7, ["promotions", "social"], now=NOW)
+    assert queries == [
+        "{ai} {from:verge} -category:promotions -category:social after:2026/10/12",
+        "{from:verge} -category:promotions -category:social after:2026/10/12",
+        "-category:promotions -category:social after:2026/10/12",
+        "after:2026/10/12",
+    ]
+
+
+def test_requested_category_is_not_excluded():
+    queries = build_gmail_queries("promotions this week", 7, ["promotions"], now=NOW)
+    assert queries == ["{category:promotions} after:2026/10/12", "after:2026/10/12"]
+
+
+def test_no_filters_is_a_single_pass():
+    assert build_gmail_queries("what happened", 7, now=NOW) == ["after:2026/10/12"]
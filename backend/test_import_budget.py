@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+# Cold-start budget for `import main` with optional integrations disabled.
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "2.0"))
+RSS_BUDGET_MB = float(os.getenv("IMPORT_RSS_BUDGET_MB", "150"))
+
+# Modules that must only be loaded lazily (behind feature flags or during warm-up).
+LAZY_MODULES = [
+    "opentelemetry.sdk",
+    "opentelemetry.exporter.cloud_trace",
+    "opentelemetry.instrumentation.fastapi",
+    "google.adk",
+    "google.cloud.texttospeech",
+    "google.cloud.storage",
+    "google.cloud.logging",
+]
+
+MEASURE_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import() -> dict:
+    """Imports main in a fresh interpreter so nothing is already cached in sys.modules."""
+    env = dict(os.environ, ENABLE_CLOUD_TRACE="false")
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_within_budget():
+    stats = measure_import()
+    assert not stats["loaded"], f"Heavy modules imported eagerly: {stats['loaded']}"
+    assert stats["seconds"] <= IMPORT_TIME_BUDGET_SECONDS, f"import main took {stats['seconds']:.2f}s"
+    assert stats["rss_mb"] <= RSS_BUDGET_MB, f"import main used {stats['rss_mb']:.0f}MB RSS"
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure_import(), indent=2))
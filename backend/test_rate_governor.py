@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.services.rate_governor import AdaptiveConcurrencyLimiter, RateGovernor, RateLimitExceeded, TokenBucket
+
+
+class ThrottledError(Exception):
+    code = 429
+
+
+def test_bucket_allows_a_burst_then_spaces_calls():
+    bucket = TokenBucket(rate=10.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Each further call books the next token: 0.1s apart at 10/s.
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_bucket_rejects_without_booking_past_max_wait():
+    bucket = TokenBucket(rate=1.0, capacity=1)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve(max_wait=0.5) is None
+    # The rejected call took no token, so the next one still waits ~1s, not ~2s.
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.01)
+
+
+def test_limiter_grows_additively_on_success():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=4)
+    for _ in range(20):
+        assert limiter.try_acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_limiter_halves_on_throttle_and_slow_calls():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, latency_target=1.0)
+    limiter.try_acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    limiter.try_acquire()
+    limiter.release(latency=2.0)
+    assert limiter.limit == 2
+    for _ in range(3):
+        limiter.try_acquire()
+        limiter.release(throttled=True)
+    assert limiter.limit == 1
+
+
+def test_limiter_caps_in_flight_calls():
+    limiter = AdaptiveConcurrencyLimiter(initial=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert not limiter.acquire(timeout=0.05)
+    limiter.release()
+    assert limiter.acquire(timeout=0.05)
+
+
+def test_call_retries_throttled_requests():
+    governor = RateGovernor(limits={"test": (100.0, 10)}, base_delay=0.01, max_delay=0.01)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ThrottledError("429 RESOURCE_EXHAUSTED")
+        return "ok"
+
+    assert governor.call("test", flaky, timeout=5) == "ok"
+    metrics = governor.metrics()["test"]
+    assert (metrics["calls"], metrics["retried"], metrics["server_throttled"]) == (3, 2, 2)
+    # Two 429s halved the concurrency limit from 4 to 1; the success then added 1 / limit.
+    assert metrics["concurrency_limit"] == 2
+
+
+def test_call_does_not_retry_other_errors():
+    governor = RateGovernor(limits={"test": (100.0, 10)})
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        governor.call("test", broken)
+    assert len(attempts) == 1
+    assert governor.metrics()["test"]["failed"] == 1
+
+
+def test_call_is_rejected_when_the_budget_runs_out_before_the_deadline():
+    governor = RateGovernor(limits={"test": (1.0, 1)})
+    assert governor.call("test", lambda: "first", timeout=1) == "first"
+    with pytest.raises(RateLimitExceeded):
+        governor.call("test", lambda: "second", timeout=0.2)
+    assert governor.metrics()["test"]["rejected"] == 1
+
+
+def test_async_call_shares_the_budget():
+    governor = RateGovernor(limits={"test": (20.0, 2)})
+
+    async def echo(value):
+        return value
+
+    async def run():
+        return await asyncio.gather(*(governor.acall("test", echo, i, timeout=5) for i in range(4)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3]
+    metrics = governor.metrics()["test"]
+    # Burst of 2, then the other two waited for tokens.
+    assert metrics["calls"] == 4
+    assert metrics["throttled"] == 2
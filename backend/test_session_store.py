@@ -0,0 +1,27 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from app.services.session_store import PersistentSessionService
+
+
+def test_count_limit_only_evicts_idle_sessions():
+    path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    service = PersistentSessionService(path, max_sessions=3, ttl_seconds=3600, purge_interval_seconds=60)
+
+    async def create(count):
+        return [(await service.create_session(app_name="agents", user_id="user")).id for _ in range(count)]
+
+    ids = asyncio.run(create(3))
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE sessions SET update_time = ? WHERE id = ?", (time.time() - 600, ids[0]))
+
+    # Over the cap by one: the idle session goes, the two just used by requests stay.
+    assert service.purge() == 1
+    # More sessions than the cap, but all of them are active: nothing is evicted.
+    ids += asyncio.run(create(2))
+    assert service.purge() == 0
+    with sqlite3.connect(path) as conn:
+        assert {row[0] for row in conn.execute("SELECT id FROM sessions")} == set(ids[1:])
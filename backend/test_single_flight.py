@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.cancellation import OperationCancelled
+from app.services.single_flight import AsyncSingleFlight, SingleFlight
+
+
+class SharedWork:
+    """Coroutine factory that records how often it started and whether it was cancelled."""
+
+    def __init__(self, seconds: float = 0.2):
+        self.seconds = seconds
+        self.started = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "digest"
+
+
+def test_concurrent_requests_share_one_run():
+    flight = AsyncSingleFlight("test-share")
+    work = SharedWork()
+
+    async def run():
+        return await asyncio.gather(*(flight.do("ai news", work) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["digest"] * 3
+    assert work.started == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_surviving_waiters_keep_the_shared_task():
+    flight = AsyncSingleFlight("test-survivors")
+    work = SharedWork()
+
+    async def run():
+        # The leader's client disconnects; the joined request still gets the result.
+        leader = asyncio.create_task(flight.do("ai news", work))
+        follower = asyncio.create_task(flight.do("ai news", work))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "digest"
+    assert work.started == 1
+    assert not work.cancelled
+
+
+def test_last_waiter_leaving_cancels_the_shared_task():
+    flight = AsyncSingleFlight("test-last-waiter")
+    work = SharedWork(seconds=5)
+
+    async def run():
+        waiters = [asyncio.create_task(flight.do("ai news", work)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started < 1
+    assert work.cancelled
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_new_request_after_cancellation_starts_fresh():
+    flight = AsyncSingleFlight("test-fresh")
+    work = SharedWork(seconds=0.1)
+
+    async def run():
+        waiter = asyncio.create_task(flight.do("ai news", work))
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return await flight.do("ai news", work)
+
+    assert asyncio.run(run()) == "digest"
+    assert work.started == 2
+
+
+def test_threaded_callers_share_one_result():
+    flight = SingleFlight("test-threads")
+    calls = []
+
+    def search():
+        calls.append(1)
+        time.sleep(0.2)
+        return ["email-1", "email-2"]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("ai news", search))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [["email-1", "email-2"]] * 3
+    assert len(calls) == 1
+
+
+def test_waiters_rerun_when_the_leader_is_cancelled():
+    flight = SingleFlight("test-rerun")
+    leader_started = threading.Event()
+    calls = []
+
+    def cancelled_search():
+        calls.append("leader")
+        leader_started.set()
+        time.sleep(0.2)
+        raise OperationCancelled()
+
+    def search():
+        calls.append("waiter")
+        return ["email-1"]
+
+    errors = []
+
+    def leader():
+        try:
+            flight.do("ai news", cancelled_search)
+        except OperationCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    leader_started.wait()
+    assert flight.do("ai news", search) == ["email-1"]
+    thread.join()
+
+    assert len(errors) == 1
+    assert calls == ["leader", "waiter"]
@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+import numpy as np
+
+from app.services.shared_store import SharedStore
+from app.services.vector_index import IVFFlatIndex
+
+DIM = 32
+DAY = 86400.0
+
+
+def clustered_vectors(n: int, topics: int = 20, seed: int = 0) -> np.ndarray:
+    # Newsletter embeddings cluster by topic; uniform noise would make every probe equally bad.
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, DIM))
+    return centers[rng.integers(topics, size=n)] + 0.3 * rng.normal(size=(n, DIM))
+
+
+def make_index(n: int, **kwargs) -> IVFFlatIndex:
+    index = IVFFlatIndex(**kwargs)
+    index.add([f"m{i}" for i in range(n)], clustered_vectors(n), [i * DAY / 10 for i in range(n)],
+              labels=[["ai"] if i % 2 else ["jobs"] for i in range(n)])
+    return index
+
+
+def test_ivf_recall_matches_brute_force():
+    index = make_index(4000, nprobe=8, min_train_size=1000, exact_threshold=0)
+    assert index.centroids is not None
+
+    queries = clustered_vectors(50, seed=1)
+    recall = np.mean([
+        len({d for d, _ in index.search(q, k=10)} & {d for d, _ in index.search_exact(q, k=10)}) / 10
+        for q in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_filters_apply_before_ranking():
+    index = make_index(4000, nprobe=2, min_train_size=1000, exact_threshold=0)
+    query = clustered_vectors(1, seed=1)[0]
+    since = 3980 * DAY / 10
+
+    results = index.search(query, k=10, since=since, labels=["ai"])
+    # Only ten recent 'ai' rows qualify; the probe widens until it finds all of them.
+    assert sorted(d for d, _ in results) == sorted(d for d, _ in index.search_exact(query, k=10, since=since, labels=["ai"]))
+    assert len(results) == 10
+    assert all(int(d[1:]) >= 3980 and int(d[1:]) % 2 for d, _ in results)
+
+
+def test_add_replaces_and_remove_compacts():
+    index = make_index(100, min_train_size=1000)
+    vectors = clustered_vectors(100)
+    target = vectors[7]
+
+    # Re-adding an id replaces its vector instead of duplicating it.
+    index.add(["m7"], [-target], [0.0])
+    assert len(index) == 100
+    assert index.search_exact(target, k=1)[0][0] != "m7"
+
+    assert index.remove(["m1", "m2", "missing"]) == 2
+    assert "m1" not in index
+    assert all(d not in {"m1", "m2"} for d, _ in index.search(vectors[1], k=100))
+
+    # Past a fifth tombstoned, rows are compacted away and lookups still line up.
+    index.remove([f"m{i}" for i in range(10, 40)])
+    assert index._size == len(index) == 68
+    assert index.scores(vectors[50], ["m50"])["m50"] > 0.99
+
+
+def test_refresh_applies_other_workers_changes():
+    store = SharedStore(os.path.join(tempfile.mkdtemp(), "albert.db"))
+    vectors = clustered_vectors(20)
+    writer = IVFFlatIndex(store=store)
+    reader = IVFFlatIndex(store=store)
+
+    writer.add([f"m{i}" for i in range(20)], vectors, [float(i) for i in range(20)], labels=[["ai"]] * 20)
+    assert len(reader) == 0
+    assert reader.refresh() == 20
+    assert reader.search_exact(vectors[3], k=1)[0][0] == "m3"
+
+    writer.remove(["m3"])
+    assert reader.refresh() == 1
+    assert "m3" not in reader
+    assert reader.refresh() == 0
+
+    # A new worker loads everything that is still live.
+    assert len(IVFFlatIndex(store=store)) == 19
@@ -10,6 +10,8 @@ const ChatInterface = () => {
     const [input, setInput] = useState('');
     const [isLoading, setIsLoading] = useState(false);
     const messagesEndRef = useRef(null);
+    // Aborting the fetch lets the backend cancel the digest it is building for us
+    const abortRef = useRef(null);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -19,6 +21,10 @@ const ChatInterface = () => {
         scrollToBottom();
     }, [messages, isLoading]);
 
+    useEffect(() => {
+        return () => abortRef.current?.abort();
+    }, []);
+
     const handleSend = async () => {
         if (!input.trim()) return;
 
@@ -32,11 +38,16 @@ const ChatInterface = () => {
         setInput('');
         setIsLoading(true);
 
+        abortRef.current?.abort();
+        const controller = new AbortController();
+        abortRef.current = controller;
+
         try {
             const response = await fetch('http://localhost:8000/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: userMessage.content })
+                body: JSON.stringify({ message: userMessage.content }),
+                signal: controller.signal
             });
 
             const data = await response.json();
@@ -47,10 +58,14 @@ const ChatInterface = () => {
 
             setMessages(prev => [...prev, { role: 'assistant', content: botText }]);
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error("Error:", error);
             setMessages(prev => [...prev, { role: 'assistant', content: "I'm having trouble connecting to my brain 😵.\n\nLet me get some human to help.\n\nDone. I have sent a support ticket to the customer service team." }]);
         } finally {
-            setIsLoading(false);
+            if (abortRef.current === controller) {
+                abortRef.current = null;
+                setIsLoading(false);
+            }
         }
     };
 